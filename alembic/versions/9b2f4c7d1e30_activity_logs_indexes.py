@@ -0,0 +1,80 @@
+"""activity_logs_indexes
+
+Revision ID: 9b2f4c7d1e30
+Revises: 65d1413adc6a
+Create Date: 2026-10-18 10:12:05.417233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2f4c7d1e30'
+down_revision: Union[str, Sequence[str], None] = '65d1413adc6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Сливаем дубликаты (activity_id, date) в запись с минимальным id:
+    # чекбокс считается отмеченным, если отмечен хотя бы в одной записи,
+    # минуты суммируются.
+    op.execute(
+        """
+        UPDATE activity_logs
+        SET value_bool = (
+                SELECT CASE
+                    WHEN COUNT(d.value_bool) = 0 THEN NULL
+                    ELSE MAX(CASE WHEN d.value_bool THEN 1 ELSE 0 END) = 1
+                END
+                FROM activity_logs AS d
+                WHERE d.activity_id = activity_logs.activity_id
+                  AND d.date = activity_logs.date
+            ),
+            value_minutes = (
+                SELECT SUM(d.value_minutes)
+                FROM activity_logs AS d
+                WHERE d.activity_id = activity_logs.activity_id
+                  AND d.date = activity_logs.date
+            )
+        WHERE id IN (
+            SELECT MIN(id)
+            FROM activity_logs
+            GROUP BY activity_id, date
+            HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM activity_logs
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id
+                FROM activity_logs
+                GROUP BY activity_id, date
+            ) AS keep
+        )
+        """
+    )
+
+    with op.batch_alter_table('activity_logs', schema=None) as batch_op:
+        batch_op.create_index(
+            'ux_activity_logs_activity_date', ['activity_id', 'date'], unique=True
+        )
+        batch_op.create_index(
+            'ix_activity_logs_activity_date_values',
+            ['activity_id', 'date', 'value_bool', 'value_minutes'],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('activity_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_logs_activity_date_values')
+        batch_op.drop_index('ux_activity_logs_activity_date')
@@ -0,0 +1,175 @@
+"""
+Микробенчмарк выбора обработчика колбэка: цепочка роутеров с фильтрами
+(как было до `bot.dispatch`) против таблицы `CallbackDispatcher`.
+
+Оба диспетчера получают одинаковые обработчики-пустышки, поэтому замеряется
+только путь от `dp.feed_update` до вызова обработчика. Перед замером
+проверяется, что для каждого колбэка оба варианта выбирают один и тот же
+обработчик.
+
+    python -m benchmarks.callback_dispatch [--iterations 2000]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters.state import StateFilter
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StorageKey
+
+from benchmarks.fake_bot import FakeSession, callback_update
+from bot.dispatch import CallbackDispatcher
+from bot.keyboards.callback_data import ActivityCallback, CalendarCallback, JobCallback
+from bot.states.activity import Download, Stats
+
+USER_ID = 1
+
+# (название, callback_data, состояние FSM)
+CASES: list[tuple[str, str, State | None]] = [
+    ("add_activity", "add_activity:time", None),
+    ("track", ActivityCallback(action="track", activity_id=42).pack(), None),
+    ("manual_time", ActivityCallback(action="manual_time", activity_id=42).pack(), None),
+    ("calendar_nav", CalendarCallback(action="NAV", year=2025, month=3).pack(), None),
+    (
+        "download_day",
+        CalendarCallback(action="DAY", year=2025, month=3, day=1).pack(),
+        Download.choosing_start_date,
+    ),
+    ("stats_month", "stats:month", None),
+    (
+        "stats_day",
+        CalendarCallback(action="DAY", year=2025, month=3, day=1).pack(),
+        Stats.choosing_end_date,
+    ),
+    ("job_cancel", JobCallback(action="cancel", job_id=7).pack(), None),
+    ("unhandled", "calendar_ignore", None),
+]
+
+
+def _handler(name: str, calls: list[str]):
+    async def handler(callback):
+        calls.append(name)
+    handler.__name__ = name
+    return handler
+
+
+def build_router_chain(calls: list[str]) -> Dispatcher:
+    """Роутеры и фильтры в том же порядке, что были подключены в main.py."""
+    dp = Dispatcher()
+    routers = {name: Router(name=name) for name in (
+        "common", "add_activity", "track_activity", "download", "stats", "help", "jobs",
+        "import_data",
+    )}
+    routers["add_activity"].callback_query(F.data.startswith("add_activity:"))(
+        _handler("add_activity", calls)
+    )
+    routers["track_activity"].callback_query(ActivityCallback.filter(F.action == "track"))(
+        _handler("track", calls)
+    )
+    routers["track_activity"].callback_query(
+        ActivityCallback.filter(F.action == "manual_time")
+    )(_handler("manual_time", calls))
+    routers["download"].callback_query(CalendarCallback.filter(F.action == "NAV"))(
+        _handler("calendar_nav", calls)
+    )
+    routers["download"].callback_query(
+        CalendarCallback.filter(F.action == "DAY"),
+        StateFilter(Download.choosing_start_date, Download.choosing_end_date),
+    )(_handler("download_day", calls))
+    routers["stats"].callback_query(F.data.startswith("stats:"))(
+        _handler("stats_month", calls)
+    )
+    routers["stats"].callback_query(
+        CalendarCallback.filter(F.action == "DAY"),
+        StateFilter(Stats.choosing_start_date, Stats.choosing_end_date),
+    )(_handler("stats_day", calls))
+    routers["jobs"].callback_query(JobCallback.filter(F.action == "cancel"))(
+        _handler("job_cancel", calls)
+    )
+    for router in routers.values():
+        dp.include_router(router)
+    return dp
+
+
+def build_table(calls: list[str]) -> Dispatcher:
+    """Те же обработчики в таблице колбэков."""
+    dp = Dispatcher()
+    table = CallbackDispatcher()
+    table.register("add_activity")(_handler("add_activity", calls))
+    table.register(ActivityCallback, action="track")(_handler("track", calls))
+    table.register(ActivityCallback, action="manual_time")(_handler("manual_time", calls))
+    table.register(CalendarCallback, action="NAV")(_handler("calendar_nav", calls))
+    table.register(
+        CalendarCallback,
+        action="DAY",
+        states=(Download.choosing_start_date, Download.choosing_end_date),
+    )(_handler("download_day", calls))
+    table.register("stats")(_handler("stats_month", calls))
+    table.register(
+        CalendarCallback,
+        action="DAY",
+        states=(Stats.choosing_start_date, Stats.choosing_end_date),
+    )(_handler("stats_day", calls))
+    table.register(JobCallback, action="cancel")(_handler("job_cancel", calls))
+    dp.include_router(table.router)
+    return dp
+
+
+async def _set_state(dp: Dispatcher, bot: Bot, state: State | None) -> None:
+    key = StorageKey(bot_id=bot.id, chat_id=USER_ID, user_id=USER_ID)
+    await dp.storage.set_state(key, state)
+
+
+async def _measure(dp: Dispatcher, bot: Bot, data: str, iterations: int) -> float:
+    """Возвращает медиану времени обработки одного колбэка в микросекундах."""
+    updates = [callback_update(USER_ID, data) for _ in range(iterations)]
+    timings = []
+    for update in updates:
+        started = time.perf_counter()
+        await dp.feed_update(bot, update)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1_000_000
+
+
+async def _main(iterations: int) -> bool:
+    bot = Bot("123456:bench", session=FakeSession())
+    chain_calls: list[str] = []
+    table_calls: list[str] = []
+    variants = {
+        "routers": (build_router_chain(chain_calls), chain_calls),
+        "table": (build_table(table_calls), table_calls),
+    }
+
+    ok = True
+    print(f"{'колбэк':14} {'роутеры, мкс':>13} {'таблица, мкс':>13} {'ускорение':>10}")
+    for name, data, state in CASES:
+        timings = {}
+        handled = {}
+        for variant, (dp, calls) in variants.items():
+            await _set_state(dp, bot, state)
+            calls.clear()
+            await dp.feed_update(bot, callback_update(USER_ID, data))
+            handled[variant] = calls[-1] if calls else None
+            timings[variant] = await _measure(dp, bot, data, iterations)
+        if handled["routers"] != handled["table"]:
+            print(f"{name}: обработчики различаются: {handled}")
+            ok = False
+        speedup = timings["routers"] / timings["table"]
+        print(f"{name:14} {timings['routers']:13.1f} {timings['table']:13.1f} {speedup:9.2f}x")
+    await bot.session.close()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк выбора обработчика колбэка.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    if not asyncio.run(_main(args.iterations)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Поддельная сессия бота и конструкторы обновлений для бенчмарков."""
+
+import datetime
+import itertools
+
+from aiogram import Bot, methods, types
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия бота, которая не ходит в сеть, а записывает исходящие вызовы.
+
+    На отправку сообщений отвечает правдоподобным `Message`, на остальные
+    методы - `True`. Содержимое отправляемых файлов вычитывается, чтобы
+    стоимость их сборки попадала в замер.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls: list[TelegramMethod] = []
+        self._message_ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.calls.append(method)
+        if isinstance(method, methods.SendDocument):
+            async for _ in method.document.read(bot):
+                pass
+        if isinstance(method, (methods.SendMessage, methods.SendDocument)):
+            return types.Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=types.Chat(id=method.chat_id, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                             raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+_update_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> types.User:
+    return types.User(id=user_id, is_bot=False, first_name="bench")
+
+
+def _chat(user_id: int) -> types.Chat:
+    return types.Chat(id=user_id, type="private")
+
+
+def message_update(user_id: int, text: str) -> types.Update:
+    """Обновление с текстовым сообщением пользователя."""
+    return types.Update(
+        update_id=next(_update_ids),
+        message=types.Message(
+            message_id=next(_update_ids),
+            date=datetime.datetime.now(),
+            chat=_chat(user_id),
+            from_user=_user(user_id),
+            text=text,
+        ),
+    )
+
+
+def callback_update(user_id: int, data: str, message_id: int = 1) -> types.Update:
+    """Обновление с нажатием inline-кнопки под сообщением бота."""
+    update_id = next(_update_ids)
+    return types.Update(
+        update_id=update_id,
+        callback_query=types.CallbackQuery(
+            id=str(update_id),
+            from_user=_user(user_id),
+            chat_instance=str(user_id),
+            data=data,
+            message=types.Message(
+                message_id=message_id,
+                date=datetime.datetime.now(),
+                chat=_chat(user_id),
+                text="bench",
+            ),
+        ),
+    )
@@ -0,0 +1,315 @@
+"""
+Бенчмарк горячих путей обработчиков на локальной SQLite.
+
+Создает временную базу с синтетическими данными (пользователи × активности × дни),
+прогоняет обновления через `dp.feed_update` с поддельной сессией бота и для
+каждого сценария считает p50/p99 задержки, запросы к БД и исходящие вызовы
+на обновление и пик выделенной памяти. Результаты пишутся в JSON; с `--baseline`
+они сравниваются с прошлым прогоном.
+
+    python -m benchmarks.handlers --users 20 --activities 10 --days 365 \\
+        --iterations 200 --output bench.json [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from aiogram import types
+
+
+@dataclass(slots=True)
+class Scenario:
+    """Сценарий: обновления одной итерации и нужно ли ждать фоновые задачи."""
+    name: str
+    updates: Callable[[int], list[types.Update]]
+    wait_jobs: bool = False
+    before: Callable[[], None] | None = None
+
+
+def _configure_environment(db_path: Path) -> None:
+    """Настраивает окружение до импорта модулей проекта (настройки читаются при импорте)."""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ.setdefault("SERVER_URL", "https://bench.invalid")
+    os.environ["FSM_STORAGE"] = "memory"
+    # Замеряем обработчики, а не ожидание лимитов Telegram
+    for name in ("OUTBOUND_GLOBAL_RATE", "OUTBOUND_CHAT_RATE", "OUTBOUND_CHAT_BURST"):
+        os.environ[name] = "1000000"
+
+
+async def _seed(users: int, activities: int, days: int, end_date: datetime.date) -> dict:
+    """Заполняет базу: у каждого пользователя половина активностей checkbox, половина time."""
+    from sqlalchemy import insert, select
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from core.config import settings
+    from db.models import Activity, ActivityLog, ActivityType, Base
+    from db.rollups import rebuild_rollups
+
+    # Отдельный движок: в режиме SQLITE_SINGLE_WRITER основной только читает
+    engine = create_async_engine(settings.DATABASE_URL)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(42)
+    start_date = end_date - datetime.timedelta(days=days - 1)
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        await db.execute(insert(Activity), [
+            {
+                "user_id": user_id,
+                "name": f"activity-{index}",
+                "type": ActivityType.CHECKBOX if index % 2 == 0 else ActivityType.TIME,
+            }
+            for user_id in range(1, users + 1)
+            for index in range(activities)
+        ])
+        result = await db.execute(select(Activity.id, Activity.user_id, Activity.type))
+        owned: dict[int, dict[ActivityType, list[int]]] = {}
+        logs = []
+        for activity_id, user_id, type in result:
+            owned.setdefault(user_id, {}).setdefault(type, []).append(activity_id)
+            for offset in range(days):
+                if rng.random() < 0.3:
+                    continue
+                logs.append({
+                    "activity_id": activity_id,
+                    "date": start_date + datetime.timedelta(days=offset),
+                    "value_bool": rng.random() < 0.5 if type == ActivityType.CHECKBOX else None,
+                    "value_minutes": rng.randint(0, 120) if type == ActivityType.TIME else None,
+                })
+        for offset in range(0, len(logs), 5000):
+            await db.execute(insert(ActivityLog), logs[offset:offset + 5000])
+        await db.commit()
+        await rebuild_rollups(db)
+        await db.commit()
+    await engine.dispose()
+    return owned
+
+
+def _build_scenarios(owned: dict, end_date: datetime.date) -> list[Scenario]:
+    from bot.handlers import stats as stats_handlers
+    from bot.keyboards.callback_data import ActivityCallback, CalendarCallback
+    from benchmarks.fake_bot import callback_update, message_update
+    from db.models import ActivityType
+
+    user_ids = sorted(owned)
+
+    def user(i: int) -> int:
+        return user_ids[i % len(user_ids)]
+
+    def track(type: ActivityType) -> Callable[[int], list[types.Update]]:
+        def updates(i: int) -> list[types.Update]:
+            user_id = user(i)
+            activity_ids = owned[user_id][type]
+            activity_id = activity_ids[(i // len(user_ids)) % len(activity_ids)]
+            data = ActivityCallback(action="track", activity_id=activity_id).pack()
+            return [callback_update(user_id, data)]
+        return updates
+
+    def calendar_day(day: datetime.date) -> str:
+        return CalendarCallback(
+            action="DAY", year=day.year, month=day.month, day=day.day
+        ).pack()
+
+    export_start = end_date - datetime.timedelta(days=29)
+
+    return [
+        Scenario("activities_list", lambda i: [message_update(user(i), "Активности")]),
+        Scenario("track_checkbox", track(ActivityType.CHECKBOX)),
+        Scenario("track_timer", track(ActivityType.TIME)),
+        Scenario(
+            "stats_month_cold",
+            lambda i: [callback_update(user(i), "stats:month")],
+            wait_jobs=True,
+            before=stats_handlers.rendered_stats_cache.clear,
+        ),
+        Scenario(
+            "stats_month_warm",
+            lambda i: [callback_update(user(i), "stats:month")],
+            wait_jobs=True,
+        ),
+        Scenario(
+            "export_30_days",
+            lambda i: [
+                message_update(user(i), "Скачать исходники"),
+                callback_update(user(i), calendar_day(export_start)),
+                callback_update(user(i), calendar_day(end_date)),
+            ],
+            wait_jobs=True,
+        ),
+    ]
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def _run_scenario(
+    scenario: Scenario, iterations: int, alloc_iterations: int, counters: dict
+) -> dict:
+    """Прогоняет сценарий: сначала замер времени, затем отдельно замер памяти."""
+    import main
+    from bot.jobs import job_queue
+
+    async def run_once(i: int) -> float:
+        if scenario.before:
+            scenario.before()
+        updates = scenario.updates(i)
+        started = time.perf_counter()
+        for update in updates:
+            await main.dp.feed_update(main.bot, update)
+        if scenario.wait_jobs:
+            await job_queue.join()
+        return time.perf_counter() - started
+
+    # Прогрев кэшей и соединений
+    for i in range(min(5, iterations)):
+        await run_once(i)
+
+    queries_before = counters["queries"]
+    calls_before = len(main.bot.session.calls)
+    timings = [await run_once(i) for i in range(iterations)]
+    queries = counters["queries"] - queries_before
+    calls = len(main.bot.session.calls) - calls_before
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(alloc_iterations):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await run_once(i)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+    finally:
+        tracemalloc.stop()
+
+    timings_ms = [timing * 1000 for timing in timings]
+    return {
+        "iterations": iterations,
+        "p50_ms": round(_percentile(timings_ms, 50), 3),
+        "p99_ms": round(_percentile(timings_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(timings_ms), 3),
+        "queries_per_iteration": round(queries / iterations, 2),
+        "outbound_calls_per_iteration": round(calls / iterations, 2),
+        "alloc_peak_kib": round(statistics.median(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def _compare(results: dict, baseline_path: Path, max_regression: float) -> bool:
+    """Печатает изменение p50/p99 относительно прошлого прогона. False - есть регрессия."""
+    baseline = json.loads(baseline_path.read_text())["scenarios"]
+    ok = True
+    for name, current in results["scenarios"].items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            change = (current[metric] - previous[metric]) / previous[metric] \
+                if previous[metric] else 0.0
+            marker = ""
+            if change > max_regression:
+                marker = "  <-- регрессия"
+                ok = False
+            print(f"{name:20} {metric}: {previous[metric]:>9} -> {current[metric]:>9} "
+                  f"({change:+.1%}){marker}")
+    return ok
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    import main
+    from benchmarks.fake_bot import FakeSession
+    from bot.throttling import outbound_throttler
+    from db.database import async_engine
+    from db.sqlite_writer import sqlite_writer
+    from sqlalchemy import event
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    end_date = datetime.date.today()
+    owned = await _seed(args.users, args.activities, args.days, end_date)
+
+    main.bot.session = FakeSession()
+    main.bot.session.middleware(outbound_throttler)
+
+    counters = {"queries": 0}
+
+    def count_query(*_):
+        counters["queries"] += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_query)
+    if sqlite_writer is not None:
+        event.listen(sqlite_writer.engine.sync_engine, "before_cursor_execute", count_query)
+
+    await main.dp.emit_startup(bot=main.bot)
+    scenarios = {}
+    try:
+        for scenario in _build_scenarios(owned, end_date):
+            if args.only and scenario.name not in args.only:
+                continue
+            iterations = args.iterations
+            if scenario.name.startswith("export"):
+                iterations = max(1, iterations // 10)
+            scenarios[scenario.name] = await _run_scenario(
+                scenario, iterations, max(1, iterations // 5), counters
+            )
+            print(f"{scenario.name:20} {scenarios[scenario.name]}")
+    finally:
+        await main.dp.emit_shutdown(bot=main.bot)
+
+    return {
+        "meta": {
+            "users": args.users,
+            "activities": args.activities,
+            "days": args.days,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк обработчиков бота.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--activities", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="Запустить только эти сценарии.")
+    parser.add_argument("--output", type=Path, default=Path("bench.json"))
+    parser.add_argument("--baseline", type=Path, help="JSON прошлого прогона для сравнения.")
+    parser.add_argument(
+        "--max-regression", type=float, default=0.2,
+        help="Допустимый рост p50/p99 относительно базового прогона (доля).",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        _configure_environment(Path(directory) / "bench.db")
+        results = asyncio.run(_main(args))
+
+    args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"Результаты записаны в {args.output}")
+    if args.baseline and not _compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Модуль для отсечения повторно доставленных обновлений по update_id."""
+
+import logging
+import os
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """
+    Окно недавно полученных `update_id` на кольцевом буфере.
+
+    `update_id` у Telegram идут подряд, поэтому ID хранится в ячейке
+    `update_id % size`: проверка и отметка - O(1), а окно из `size`
+    последних обновлений помнится без коллизий. Состояние можно
+    сохранять в файл, чтобы повторы после перезапуска тоже отсекались.
+    """
+
+    def __init__(self, size: int, path: str | None = None):
+        self.size = size
+        self.path = path
+        self._slots = array("q", [-1]) * size
+        self.duplicates = 0
+
+    def check_and_mark(self, update_id: int) -> bool:
+        """
+        Отмечает обновление как полученное.
+
+        Returns:
+            True, если обновление с таким ID уже было в окне (повтор).
+        """
+        slot = update_id % self.size
+        if self._slots[slot] == update_id:
+            self.duplicates += 1
+            return True
+        self._slots[slot] = update_id
+        return False
+
+    def forget(self, update_id: int) -> None:
+        """Снимает отметку, чтобы повторная доставка обновления была принята."""
+        slot = update_id % self.size
+        if self._slots[slot] == update_id:
+            self._slots[slot] = -1
+
+    def load(self) -> None:
+        """Загружает окно из файла, если он задан и существует."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        slots = array("q")
+        try:
+            with open(self.path, "rb") as f:
+                slots.frombytes(f.read())
+        except (OSError, ValueError):
+            logger.warning("Не удалось прочитать окно update_id из %s", self.path)
+            return
+        if len(slots) == self.size:
+            self._slots = slots
+
+    def save(self) -> None:
+        """Сохраняет окно в файл, если он задан."""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._slots.tobytes())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,183 @@
+"""
+Модуль с таблицей обработчиков колбэков.
+
+Обработчики колбэков регистрируются не фильтрами роутеров, а в таблице
+по префиксу `callback_data` и действию. Для каждого колбэка префикс
+разбирается один раз, данные собираются в CallbackData без валидации pydantic
+(`model_construct`), а обработчик находится по словарю и состоянию FSM,
+без последовательной проверки фильтров всех роутеров.
+"""
+
+import types as pytypes
+import typing
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from aiogram import Router, types
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.state import State
+
+Converter = Callable[[str], Any]
+
+
+@dataclass(slots=True)
+class _Route:
+    """Обработчик в таблице и состояния FSM, в которых он срабатывает."""
+    handler: HandlerObject
+    callback_data: type[CallbackData] | None
+    states: frozenset[str | None] | None
+
+
+def _converter(annotation: Any) -> Converter | None:
+    """Возвращает функцию разбора значения поля или None, если тип не поддержан."""
+    if annotation is int or annotation is str:
+        return annotation
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) in (typing.Union, pytypes.UnionType) \
+            and len(args) == 2 and type(None) in args:
+        inner = _converter(args[0] if args[1] is type(None) else args[1])
+        if inner is None:
+            return None
+        # CallbackData.pack упаковывает None в пустую строку
+        return lambda value: inner(value) if value else None
+    return None
+
+
+class _Unpacker:
+    """Разбор данных после префикса в CallbackData без валидации pydantic."""
+
+    def __init__(self, callback_data: type[CallbackData]):
+        self.callback_data = callback_data
+        self.names = tuple(callback_data.model_fields)
+        # Значения необязательных полей в конце: их может не быть в данных
+        # старых клавиатур, отправленных до добавления поля
+        self.defaults = {
+            name: field.default
+            for name, field in callback_data.model_fields.items()
+            if not field.is_required()
+        }
+        converters = [
+            _converter(field.annotation) for field in callback_data.model_fields.values()
+        ]
+        # Для неподдержанных типов полей разбираем как обычно, через unpack
+        self.converters = None if None in converters else tuple(converters)
+
+    def __call__(self, data: str, payload: str) -> CallbackData | None:
+        if self.converters is None:
+            try:
+                return self.callback_data.unpack(data)
+            except (TypeError, ValueError):
+                return None
+        parts = payload.split(self.callback_data.__separator__)
+        if len(parts) > len(self.names):
+            return None
+        missing = self.names[len(parts):]
+        if any(name not in self.defaults for name in missing):
+            return None
+        try:
+            values = {
+                name: convert(part)
+                for name, convert, part in zip(self.names, self.converters, parts)
+            }
+        except ValueError:
+            return None
+        for name in missing:
+            values[name] = self.defaults[name]
+        return self.callback_data.model_construct(**values)
+
+
+class CallbackDispatcher:
+    """
+    Таблица обработчиков колбэков: префикс -> действие -> обработчики.
+
+    Подключается к диспетчеру одним роутером (`router`). Обработчик выбирается
+    фильтром этого роутера и подставляется в `data["handler"]`, поэтому
+    middleware (учет запросов, флаги) видят настоящий обработчик.
+    """
+
+    def __init__(self):
+        self._routes: dict[str, dict[str | None, list[_Route]]] = {}
+        self._unpackers: dict[str, _Unpacker] = {}
+        self.router = Router(name="callbacks")
+        self.router.callback_query.register(self._call, self._resolve)
+
+    def register(
+        self,
+        prefix: str | type[CallbackData],
+        action: str | None = None,
+        states: tuple[State | None, ...] | None = None,
+    ):
+        """
+        Регистрирует обработчик колбэков с префиксом `prefix` (строкой или
+        классом CallbackData). Для строкового префикса действие - часть данных
+        после первого `:`, для CallbackData - поле `action`. Без `action`
+        обработчик получает все действия префикса, без `states` - срабатывает
+        в любом состоянии FSM.
+        """
+        callback_data = None
+        if isinstance(prefix, type):
+            callback_data = prefix
+            prefix = callback_data.__prefix__
+            self._unpackers.setdefault(prefix, _Unpacker(callback_data))
+        state_names = None
+        if states is not None:
+            state_names = frozenset(
+                state.state if isinstance(state, State) else state for state in states
+            )
+
+        def decorator(func):
+            route = _Route(
+                handler=HandlerObject(callback=func),
+                callback_data=callback_data,
+                states=state_names,
+            )
+            self._routes.setdefault(prefix, {}).setdefault(action, []).append(route)
+            return func
+        return decorator
+
+    def resolve(
+        self, data: str, raw_state: str | None = None
+    ) -> tuple[_Route, CallbackData | None] | None:
+        """Находит обработчик для `callback_data` и состояния FSM."""
+        prefix, _, payload = data.partition(":")
+        actions = self._routes.get(prefix)
+        if actions is None:
+            return None
+
+        parsed = None
+        unpacker = self._unpackers.get(prefix)
+        if unpacker is not None:
+            parsed = unpacker(data, payload)
+            if parsed is None:
+                return None
+            action = getattr(parsed, "action", None)
+        else:
+            action = payload.partition(":")[0]
+
+        for candidates in (actions.get(action), actions.get(None)):
+            for route in candidates or ():
+                if route.states is None or raw_state in route.states:
+                    return route, parsed
+        return None
+
+    async def _resolve(
+        self, callback: types.CallbackQuery, raw_state: str | None = None
+    ) -> bool | dict[str, Any]:
+        if callback.data is None:
+            return False
+        resolved = self.resolve(callback.data, raw_state)
+        if resolved is None:
+            return False
+        route, parsed = resolved
+        found: dict[str, Any] = {"handler": route.handler}
+        if parsed is not None:
+            found["callback_data"] = parsed
+        return found
+
+    @staticmethod
+    async def _call(callback: types.CallbackQuery, **data: Any) -> Any:
+        return await data["handler"].call(callback, **data)
+
+
+callbacks = CallbackDispatcher()
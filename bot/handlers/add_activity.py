@@ -5,10 +5,10 @@ from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
+from bot.dispatch import callbacks
 from bot.keyboards.inline import get_activity_type_keyboard
 from bot.states.activity import AddActivity
 from db import crud
-from db.database import get_async_session
 from db.models import ActivityType
 
 router = Router()
@@ -24,7 +24,7 @@ async def handle_add_activity_start(message: types.Message):
     )
 
 
-@router.callback_query(F.data.startswith("add_activity:"))
+@callbacks.register("add_activity")
 async def handle_activity_type_selection(
     callback: types.CallbackQuery, state: FSMContext
 ):
@@ -44,7 +44,7 @@ async def handle_activity_type_selection(
 
 @router.message(AddActivity.waiting_for_name)
 async def handle_new_activity_name(
-    message: types.Message, state: FSMContext
+    message: types.Message, state: FSMContext, db: AsyncSession
 ):
     """Сохраняет новую активность в базу данных."""
     if not message.from_user:
@@ -58,36 +58,41 @@ async def handle_new_activity_name(
     activity_type_str = user_data["activity_type"]
     activity_type = ActivityType[activity_type_str.upper()]
 
-    async for session in get_async_session():
-        db: AsyncSession = session
-        try:
-            # Проверяем, существует ли активность с таким именем у этого пользователя
-            existing_activity = await crud.get_activity_by_name(
-                db, user_id=user_id, name=activity_name
-            )
-            if existing_activity:
-                await message.answer(
-                    f"Активность с названием '<b>{activity_name}</b>' у вас уже существует. "
-                    "Попробуйте другое название."
-                )
-                return
-
+    try:
+        # Проверяем, существует ли активность с таким именем у этого пользователя
+        existing_activity = await crud.get_activity_by_name(
+            db, user_id=user_id, name=activity_name
+        )
+        if not existing_activity:
             # Создаем новую активность
             await crud.create_activity(
                 db=db, user_id=user_id, name=activity_name, type=activity_type
             )
-            await state.clear()
-            await message.answer(
-                f"✅ Новая активность '<b>{activity_name}</b>' "
-                f"(тип: {activity_type_str}) успешно добавлена!"
-            )
-        except IntegrityError:
-            await state.clear()
-            await message.answer(
-                "Произошла ошибка при добавлении активности. "
-                "Возможно, такое имя уже занято."
-            )
-        except Exception as e:
-            await state.clear()
-            await message.answer(f"Произошла непредвиденная ошибка: {e}")
-            
+        # Фиксируем транзакцию до ответа пользователю
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        await state.clear()
+        await message.answer(
+            "Произошла ошибка при добавлении активности. "
+            "Возможно, такое имя уже занято."
+        )
+        return
+    except Exception as e:
+        await db.rollback()
+        await state.clear()
+        await message.answer(f"Произошла непредвиденная ошибка: {e}")
+        return
+
+    if existing_activity:
+        await message.answer(
+            f"Активность с названием '<b>{activity_name}</b>' у вас уже существует. "
+            "Попробуйте другое название."
+        )
+        return
+
+    await state.clear()
+    await message.answer(
+        f"✅ Новая активность '<b>{activity_name}</b>' "
+        f"(тип: {activity_type_str}) успешно добавлена!"
+    )
@@ -1,19 +1,26 @@
 """Обработчики для скачивания исходников в формате Markdown с помощью календаря."""
 
 import datetime
+import tempfile
+import zipfile
+from contextlib import aclosing
+from typing import AsyncGenerator, Awaitable, BinaryIO, Callable
 
-from aiogram import F, Router, types
+from aiogram import Bot, F, Router, types
 from aiogram.fsm.context import FSMContext
-from aiogram.filters.state import StateFilter
-from aiogram.types import BufferedInputFile
+from aiogram.types import BufferedInputFile, InputFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from bot.dispatch import callbacks
+from bot.jobs import JobContext, job_queue
 from bot.keyboards import inline as inline_kb
 from bot.keyboards.callback_data import CalendarCallback
 from bot.states.activity import Download
+from core.config import settings
 from db import crud
-from db.database import get_async_session
-from db.models import ActivityType
+from db.database import async_session_factory
+from db.models import Activity, ActivityType
+from db.write_behind import write_behind
 
 router = Router()
 
@@ -29,7 +36,7 @@ async def handle_download_start(message: types.Message, state: FSMContext):
     )
 
 
-@router.callback_query(CalendarCallback.filter(F.action == "NAV"))
+@callbacks.register(CalendarCallback, action="NAV")
 async def handle_calendar_navigation(
     callback: types.CallbackQuery, callback_data: CalendarCallback
 ):
@@ -41,9 +48,10 @@ async def handle_calendar_navigation(
     await callback.answer()
 
 
-@router.callback_query(
-    CalendarCallback.filter(F.action == "DAY"),
-    StateFilter(Download.choosing_start_date, Download.choosing_end_date),
+@callbacks.register(
+    CalendarCallback,
+    action="DAY",
+    states=(Download.choosing_start_date, Download.choosing_end_date),
 )
 async def handle_day_selection(
     callback: types.CallbackQuery,
@@ -80,67 +88,163 @@ async def handle_day_selection(
             return
 
         await state.clear()
-        await callback.message.edit_text(
-            f"Готовлю файлы за период с "
-            f"<b>{start_date.strftime('%d.%m.%Y')}</b> по "
-            f"<b>{end_date.strftime('%d.%m.%Y')}</b>..."
+        period_text = (
+            f"с <b>{start_date.strftime('%d.%m.%Y')}</b> "
+            f"по <b>{end_date.strftime('%d.%m.%Y')}</b>"
         )
-
-        # Запускаем генерацию и отправку файлов
-        await generate_and_send_files(
-            message=callback.message,
-            user_id=user_id,
-            start_date=start_date,
-            end_date=end_date,
+        message = callback.message
+
+        async def run_export(context: JobContext):
+            sent = await generate_and_send_files(
+                message=message,
+                user_id=user_id,
+                start_date=start_date,
+                end_date=end_date,
+                progress=context.progress,
+            )
+            if sent:
+                await context.finish(f"✅ Файлы за период {period_text} отправлены.")
+            else:
+                await context.finish("У вас нет активностей для экспорта.")
+
+        # Генерация и отправка файлов идут в фоне, обработчик сразу отвечает
+        job = await job_queue.submit(
+            user_id,
+            title=f"Экспорт за период {period_text}",
+            func=run_export,
+            status_message=message,
         )
+        if job is None:
+            await message.edit_text(
+                "У вас уже выполняется задача. Дождитесь ее завершения и попробуйте снова."
+            )
 
     await callback.answer()
 
 
+class SpooledInputFile(InputFile):
+    """Файл для отправки в Telegram из временного (в памяти или на диске) файла."""
+
+    def __init__(self, file: BinaryIO, filename: str):
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+def render_day_markdown(
+    activities: list[Activity],
+    daily_logs: dict[int, tuple[datetime.date, int, bool | None, int | None]],
+) -> str:
+    """Формирует Markdown-файл за день с front-matter `название: значение`."""
+    md_content = "---\n"
+    for activity in activities:
+        log = daily_logs.get(activity.id)
+        value = "false" if activity.type == ActivityType.CHECKBOX else 0
+        if log:
+            _, _, value_bool, value_minutes = log
+            if activity.type == ActivityType.CHECKBOX:
+                value = str(value_bool).lower() if value_bool is not None else "false"
+            elif activity.type == ActivityType.TIME:
+                value = value_minutes if value_minutes is not None else 0
+        md_content += f"{activity.name}: {value}\n"
+    md_content += "---"
+    return md_content
+
+
+async def iter_daily_markdown(
+    db: AsyncSession,
+    user_id: int,
+    activities: list[Activity],
+    start_date: datetime.date,
+    end_date: datetime.date,
+) -> AsyncGenerator[tuple[datetime.date, str], None]:
+    """
+    Отдает Markdown за каждый день периода, читая логи потоком в порядке дат.
+    В памяти держатся только логи текущего дня.
+    """
+    logs = crud.stream_user_logs_for_period(
+        db, user_id=user_id, start_date=start_date, end_date=end_date
+    )
+    async with aclosing(logs):
+        pending = await anext(logs, None)
+        current_date = start_date
+        while current_date <= end_date:
+            daily_logs = {}
+            while pending is not None and pending[0] == current_date:
+                daily_logs[pending[1]] = pending
+                pending = await anext(logs, None)
+            yield current_date, render_day_markdown(activities, daily_logs)
+            current_date += datetime.timedelta(days=1)
+
+
+async def _report_progress(
+    days: AsyncGenerator[tuple[datetime.date, str], None],
+    period_days: int,
+    progress: Callable[[str], Awaitable[None]],
+) -> AsyncGenerator[tuple[datetime.date, str], None]:
+    async with aclosing(days):
+        processed = 0
+        async for item in days:
+            yield item
+            processed += 1
+            await progress(f"обработано {processed} из {period_days} дн.")
+
+
 async def generate_and_send_files(
     message: types.Message,
     user_id: int,
     start_date: datetime.date,
     end_date: datetime.date,
-):
-    """Генерирует и отправляет файлы с логами за указанный период."""
-    async for session in get_async_session():
-        db: AsyncSession = session
+    progress: Callable[[str], Awaitable[None]] | None = None,
+) -> bool:
+    """
+    Генерирует и отправляет файлы с логами за указанный период.
+
+    Короткие периоды отправляются отдельными .md файлами, а периоды от
+    `EXPORT_ZIP_MIN_DAYS` дней - одним ZIP-архивом, который собирается
+    во временном файле по мере чтения логов. `progress` получает
+    сообщения о количестве обработанных дней.
+
+    Returns:
+        True, если файлы отправлены, и False, если у пользователя нет активностей.
+    """
+    if settings.WRITE_BEHIND_ENABLED:
+        # Отчет должен учитывать еще не записанные нажатия
+        await write_behind.flush()
+    # Выполняется в фоновой задаче вне обновления, поэтому сессия своя
+    async with async_session_factory() as db:
         all_activities = await crud.get_user_activities(db, user_id=user_id)
         if not all_activities:
-            await message.answer("У вас нет активностей для экспорта.")
-            return
-            
-        logs = await crud.get_user_logs_for_period(
-            db, user_id=user_id, start_date=start_date, end_date=end_date
-        )
-
-        grouped_logs = {}
-        for log in logs:
-            if log.date not in grouped_logs:
-                grouped_logs[log.date] = {}
-            grouped_logs[log.date][log.activity_id] = log
-
-        current_date = start_date
-        while current_date <= end_date:
-            daily_logs = grouped_logs.get(current_date, {})
-            md_content = f"---\n"
-            for activity in all_activities:
-                log = daily_logs.get(activity.id)
-                value = "false" if activity.type == ActivityType.CHECKBOX else 0
-                if log:
-                    if activity.type == ActivityType.CHECKBOX:
-                        value = str(log.value_bool).lower() if log.value_bool is not None else "false"
-                    elif activity.type == ActivityType.TIME:
-                        value = log.value_minutes if log.value_minutes is not None else 0
-                md_content += f"{activity.name}: {value}\n"
-            md_content += "---"
-
-            file_to_send = BufferedInputFile(
-                md_content.encode("utf-8"),
-                filename=f"{current_date.strftime('%Y-%m-%d')}.md",
-            )
-            await message.answer_document(file_to_send)
-            current_date += datetime.timedelta(days=1)
+            return False
+
+        days = iter_daily_markdown(db, user_id, all_activities, start_date, end_date)
+        period_days = (end_date - start_date).days + 1
+        if progress:
+            days = _report_progress(days, period_days, progress)
+
+        if period_days < settings.EXPORT_ZIP_MIN_DAYS:
+            async for day, md_content in days:
+                file_to_send = BufferedInputFile(
+                    md_content.encode("utf-8"),
+                    filename=f"{day.strftime('%Y-%m-%d')}.md",
+                )
+                await message.answer_document(file_to_send)
+        else:
+            with tempfile.SpooledTemporaryFile(
+                max_size=settings.EXPORT_SPOOL_MAX_BYTES
+            ) as spool:
+                with zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                    async for day, md_content in days:
+                        archive.writestr(f"{day.strftime('%Y-%m-%d')}.md", md_content)
+
+                archive_name = (
+                    f"{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}.zip"
+                )
+                await message.answer_document(SpooledInputFile(spool, filename=archive_name))
 
     await message.answer("Все готово!")
+    return True
@@ -11,6 +11,7 @@ HELP_MESSAGE = """
 **Основные команды:**
 - /start или /menu: Вернуться в главное меню.
 - /help: Показать это сообщение.
+- /import: Загрузить данные из файлов, полученных при скачивании исходников.
 
 **Главное меню:**
 Здесь ты найдеешь кнопки для управления активностями.
@@ -0,0 +1,103 @@
+"""Обработчики для импорта логов из Markdown-файлов экспорта."""
+
+import tempfile
+from pathlib import Path
+
+from aiogram import F, Router, types
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.jobs import JobContext, job_queue
+from bot.states.activity import ImportData
+from core.config import settings
+from db.database import async_session_factory
+from db.importer import ImportResult, import_days, iter_zip_days, parse_day_file
+
+router = Router()
+
+
+def _format_result(result: ImportResult) -> str:
+    text = f"✅ Импорт завершен. Дней: {result.days}, записано логов: {result.logs}."
+    if result.invalid_values:
+        text += f"\nНекорректных значений: {result.invalid_values}."
+    if result.unknown_activities:
+        names = ", ".join(sorted(result.unknown_activities))
+        text += f"\nНет таких активностей (сначала добавьте их): {names}."
+    if result.skipped_files:
+        text += f"\nПропущено файлов: {len(result.skipped_files)}."
+    return text
+
+
+@router.message(Command("import"))
+async def handle_import_start(message: types.Message, state: FSMContext):
+    """Начинает импорт: просит прислать файлы экспорта."""
+    await state.set_state(ImportData.waiting_for_file)
+    await message.answer(
+        "Пришлите ZIP-архив или файлы <b>ГГГГ-ММ-ДД.md</b>, полученные при скачивании "
+        "исходников. Значения запишутся в активности с теми же названиями.\n"
+        "Чтобы закончить, отправьте любое сообщение."
+    )
+
+
+@router.message(ImportData.waiting_for_file, F.document)
+async def handle_import_file(message: types.Message, state: FSMContext, db: AsyncSession):
+    """Импортирует присланный файл: .md сразу, ZIP - в фоновой задаче."""
+    document = message.document
+    user_id = message.from_user.id
+    suffix = Path(document.file_name or "").suffix.lower()
+
+    if suffix not in (".md", ".zip"):
+        await message.answer("Поддерживаются только файлы .md и .zip.")
+        return
+    if document.file_size and document.file_size > settings.IMPORT_MAX_UPLOAD_BYTES:
+        await message.answer("Файл слишком большой.")
+        return
+
+    if suffix == ".md":
+        content = await message.bot.download(document)
+        day = parse_day_file(document.file_name, content.read())
+        if day is None:
+            await message.answer("Имя файла должно быть датой: <b>ГГГГ-ММ-ДД.md</b>.")
+            return
+        result = await import_days(db, user_id, [day])
+        await message.answer(_format_result(result))
+        return
+
+    await state.clear()
+    status_message = await message.answer("Архив получен.")
+
+    async def run_import(context: JobContext):
+        # Архив скачивается во временный файл, который уходит на диск, если он большой
+        with tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_BYTES) as spool:
+            await context.progress("загрузка архива...", force=True)
+            await message.bot.download(document, destination=spool)
+            spool.seek(0)
+            result = ImportResult()
+            async with async_session_factory() as session:
+                await import_days(
+                    session,
+                    user_id,
+                    iter_zip_days(spool, result),
+                    result,
+                    progress=context.progress,
+                )
+        await context.finish(_format_result(result))
+
+    job = await job_queue.submit(
+        user_id,
+        title="Импорт архива",
+        func=run_import,
+        status_message=status_message,
+    )
+    if job is None:
+        await status_message.edit_text(
+            "У вас уже выполняется задача. Дождитесь ее завершения и попробуйте снова."
+        )
+
+
+@router.message(ImportData.waiting_for_file)
+async def handle_import_done(message: types.Message, state: FSMContext):
+    """Завершает импорт по любому сообщению без файла."""
+    await state.clear()
+    await message.answer("Импорт завершен.")
@@ -0,0 +1,16 @@
+"""Обработчики для управления фоновыми задачами."""
+
+from aiogram import types
+
+from bot.dispatch import callbacks
+from bot.jobs import job_queue
+from bot.keyboards.callback_data import JobCallback
+
+
+@callbacks.register(JobCallback, action="cancel")
+async def handle_job_cancel(callback: types.CallbackQuery, callback_data: JobCallback):
+    """Отменяет фоновую задачу пользователя."""
+    if job_queue.cancel(callback_data.job_id, user_id=callback.from_user.id):
+        await callback.answer("Задача отменяется...")
+    else:
+        await callback.answer("Задача уже завершена.", show_alert=True)
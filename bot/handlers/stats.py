@@ -4,19 +4,42 @@ import datetime
 
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
-from aiogram.filters.state import StateFilter
-from sqlalchemy.ext.asyncio import AsyncSession
 
+from bot.dispatch import callbacks
+from bot.jobs import JobContext, job_queue
 from bot.keyboards import inline as inline_kb
 from bot.keyboards.callback_data import CalendarCallback
 from bot.states.activity import Stats
+from core.cache import LRUCache
+from core.config import settings
 from db import crud
-from db.database import get_async_session
+from db.cache import data_versions
+from db.database import async_session_factory
 from db.models import ActivityType
+from db.write_behind import write_behind
 
 router = Router()
 
 
+# Отрисованная статистика: (user_id, start, end, версия данных) -> текст.
+# Версии локальны для процесса (см. `DataVersions`), поэтому и кэш локальный
+rendered_stats_cache = LRUCache(
+    maxsize=settings.STATS_CACHE_SIZE, ttl=settings.STATS_CACHE_TTL
+)
+
+
+def _stats_cache_key(
+    user_id: int, start_date: datetime.date, end_date: datetime.date
+) -> tuple[int, datetime.date, datetime.date, int]:
+    return user_id, start_date, end_date, data_versions.get(user_id)
+
+
+def _format_stats(body: str, period_text: str) -> str:
+    if not body:
+        return f"Нет данных для статистики {period_text}."
+    return f"📊 <b>Статистика {period_text}:</b>\n\n{body}"
+
+
 async def show_stats_for_period(
     message: types.Message,
     user_id: int,
@@ -25,24 +48,58 @@ async def show_stats_for_period(
     period_text: str,
 ):
     """Отображает статистику за указанный период."""
-    async for session in get_async_session():
-        db: AsyncSession = session
-        stats = await crud.get_user_stats_for_period(
-            db, user_id=user_id, start_date=start_date, end_date=end_date
-        )
-
-        if not stats:
-            await message.edit_text(f"Нет данных для статистики {period_text}.")
-            return
+    cache_key = _stats_cache_key(user_id, start_date, end_date)
+    body = rendered_stats_cache.get(cache_key)
+    if body is None:
+        if settings.WRITE_BEHIND_ENABLED:
+            # Отчет должен учитывать еще не записанные нажатия
+            await write_behind.flush()
+        # Выполняется в фоновой задаче вне обновления, поэтому сессия своя
+        async with async_session_factory() as db:
+            stats = await crud.get_user_stats_for_period(
+                db, user_id=user_id, start_date=start_date, end_date=end_date
+            )
 
-        response_text = f"📊 <b>Статистика {period_text}:</b>\n\n"
+        body = ""
         for name, type, total_minutes, total_checks in stats:
             if type == ActivityType.CHECKBOX:
-                response_text += f"☑️ {name}: отмечено {total_checks or 0} раз\n"
+                body += f"☑️ {name}: отмечено {total_checks or 0} раз\n"
             elif type == ActivityType.TIME:
-                response_text += f"⏱️ {name}: {total_minutes or 0} мин.\n"
+                body += f"⏱️ {name}: {total_minutes or 0} мин.\n"
+        rendered_stats_cache.set(cache_key, body)
 
-        await message.edit_text(response_text)
+    await message.edit_text(_format_stats(body, period_text))
+
+
+async def enqueue_stats_for_period(
+    message: types.Message,
+    user_id: int,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    period_text: str,
+):
+    """
+    Ставит расчет статистики в фоновую очередь и сразу возвращается.
+    Если данные не менялись с прошлого просмотра, ответ берется из кэша без очереди.
+    """
+    body = rendered_stats_cache.get(_stats_cache_key(user_id, start_date, end_date))
+    if body is not None:
+        await message.edit_text(_format_stats(body, period_text))
+        return
+
+    async def run_stats(context: JobContext):
+        await show_stats_for_period(message, user_id, start_date, end_date, period_text)
+
+    job = await job_queue.submit(
+        user_id,
+        title=f"Статистика {period_text}",
+        func=run_stats,
+        status_message=message,
+    )
+    if job is None:
+        await message.edit_text(
+            "У вас уже выполняется задача. Дождитесь ее завершения и попробуйте снова."
+        )
 
 
 @router.message(F.text == "Просмотр статистики")
@@ -52,7 +109,7 @@ async def handle_stats_start(message: types.Message):
     await message.answer("Выберите период для просмотра статистики:", reply_markup=keyboard)
 
 
-@router.callback_query(F.data.startswith("stats:"))
+@callbacks.register("stats")
 async def handle_stats_period(callback: types.CallbackQuery, state: FSMContext):
     """Обрабатывает выбор периода и показывает статистику."""
     await callback.answer()
@@ -63,14 +120,14 @@ async def handle_stats_period(callback: types.CallbackQuery, state: FSMContext):
     if period == "day":
         start_date = end_date = today
         period_text = "за сегодня"
-        await show_stats_for_period(
+        await enqueue_stats_for_period(
             callback.message, user_id, start_date, end_date, period_text
         )
     elif period == "week":
         start_date = today - datetime.timedelta(days=today.weekday())
         end_date = start_date + datetime.timedelta(days=6)
         period_text = "за текущую неделю"
-        await show_stats_for_period(
+        await enqueue_stats_for_period(
             callback.message, user_id, start_date, end_date, period_text
         )
     elif period == "month":
@@ -79,7 +136,7 @@ async def handle_stats_period(callback: types.CallbackQuery, state: FSMContext):
             day=1
         ) - datetime.timedelta(days=1)
         period_text = "за текущий месяц"
-        await show_stats_for_period(
+        await enqueue_stats_for_period(
             callback.message, user_id, start_date, end_date, period_text
         )
     elif period == "custom":
@@ -90,8 +147,11 @@ async def handle_stats_period(callback: types.CallbackQuery, state: FSMContext):
         )
 
 
-@router.callback_query(Stats.choosing_start_date, CalendarCallback.filter(F.action == "NAV"))
-@router.callback_query(Stats.choosing_end_date, CalendarCallback.filter(F.action == "NAV"))
+@callbacks.register(
+    CalendarCallback,
+    action="NAV",
+    states=(Stats.choosing_start_date, Stats.choosing_end_date),
+)
 async def handle_stats_calendar_navigation(
     callback: types.CallbackQuery, callback_data: CalendarCallback
 ):
@@ -103,9 +163,10 @@ async def handle_stats_calendar_navigation(
     await callback.answer()
 
 
-@router.callback_query(
-    CalendarCallback.filter(F.action == "DAY"),
-    StateFilter(Stats.choosing_start_date, Stats.choosing_end_date),
+@callbacks.register(
+    CalendarCallback,
+    action="DAY",
+    states=(Stats.choosing_start_date, Stats.choosing_end_date),
 )
 async def handle_stats_day_selection(
     callback: types.CallbackQuery,
@@ -147,6 +208,6 @@ async def handle_stats_day_selection(
         period_text = (
             f"c {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}"
         )
-        await show_stats_for_period(
+        await enqueue_stats_for_period(
             callback.message, user_id, start_date, end_date, period_text
         )
@@ -1,37 +1,82 @@
 """Обработчики для отображения и трекинга активностей."""
 import asyncio
 import datetime
-import time
+import logging
 
 from aiogram import Bot, F, Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from bot.dispatch import callbacks
 from bot.keyboards import inline as inline_kb
-from bot.keyboards.callback_data import ActivityCallback
+from bot.keyboards.callback_data import ActivitiesPageCallback, ActivityCallback
+from bot.keyboards.diff import markup_fingerprints
 from bot.states.activity import TrackActivity
+from core.config import settings
 from db import crud
-from db.database import get_async_session
 from db.models import ActivityType
+from db.read_models import ActivitiesPage
+from db.write_behind import write_behind
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _delete_later(message: types.Message, delay: float):
+    """Удаляет сообщение через `delay` секунд."""
+    await asyncio.sleep(delay)
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
 
 async def _get_and_show_activities(
     bot: Bot,
     user_id: int,
-    state: FSMContext,
     db: AsyncSession,
     chat_id: int,
     message_id: int | None = None,
+    after: int = 0,
+    before: int | None = None,
 ):
     """
     Вспомогательная функция для получения и отображения активностей.
     Может либо отправить новое сообщение, либо отредактировать существующее.
+    Показывает одну страницу активностей: с id больше `after` или,
+    если задан `before`, последнюю страницу перед ним.
     """
-    activities = await crud.get_user_activities(db, user_id=user_id)
+    today = datetime.date.today()
+
+    async def load_page(after: int, before: int | None) -> ActivitiesPage:
+        return await crud.get_activities_page(
+            db,
+            user_id=user_id,
+            limit=settings.ACTIVITIES_PAGE_SIZE,
+            log_date=today,
+            after=after,
+            before=before,
+        )
 
-    if not activities:
+    if settings.WRITE_BEHIND_ENABLED:
+        # Еще не записанные нажатия накладываются на данные из БД
+        page = await write_behind.read_through(
+            lambda: load_page(after, before), log_date=today
+        )
+    else:
+        page = await load_page(after, before)
+    if not page.rows and (after or before is not None):
+        # Страница опустела (устаревший курсор) - показываем первую
+        return await _get_and_show_activities(bot, user_id, db, chat_id, message_id)
+    # Фиксируем транзакцию и отпускаем соединение до запросов к Telegram
+    await db.commit()
+
+    if not page.rows:
         await bot.send_message(
             chat_id,
             "У вас пока нет добавленных активностей. "
@@ -39,46 +84,45 @@ async def _get_and_show_activities(
         )
         return
 
-    today_logs = await crud.get_today_logs_for_user_activities(db, user_id=user_id)
-    user_data = await state.get_data()
-    running_timers = user_data.get("running_timers", {})
-
-    keyboard = await inline_kb.get_activities_keyboard(
-        activities, today_logs, running_timers
-    )
+    keyboard = await inline_kb.get_activities_keyboard(page)
 
     if message_id:
+        # Клавиатура не изменилась - не тратим запрос к Telegram
+        if markup_fingerprints.is_unchanged(chat_id, message_id, keyboard):
+            return
         try:
             await bot.edit_message_reply_markup(
                 chat_id=chat_id, message_id=message_id, reply_markup=keyboard
             )
-        except Exception:
-            pass
+        except TelegramBadRequest as e:
+            if "message is not modified" not in e.message:
+                logger.warning("Не удалось обновить клавиатуру активностей: %s", e.message)
+                return
+        markup_fingerprints.remember(chat_id, message_id, keyboard)
     else:
-        await bot.send_message(
+        sent_message = await bot.send_message(
             chat_id, "Выберите активность для отметки:", reply_markup=keyboard
         )
+        markup_fingerprints.remember(chat_id, sent_message.message_id, keyboard)
 
 
 @router.message(F.text == "Активности")
-async def handle_activities_list(message: types.Message, state: FSMContext):
+async def handle_activities_list(message: types.Message, db: AsyncSession):
     """Отображает список всех активностей для трекинга."""
     if not message.from_user:
         return
 
-    async for session in get_async_session():
-        await _get_and_show_activities(
-            bot=message.bot,
-            user_id=message.from_user.id,
-            state=state,
-            db=session,
-            chat_id=message.chat.id,
-        )
+    await _get_and_show_activities(
+        bot=message.bot,
+        user_id=message.from_user.id,
+        db=db,
+        chat_id=message.chat.id,
+    )
 
 
-@router.callback_query(ActivityCallback.filter(F.action == "track"))
+@callbacks.register(ActivityCallback, action="track")
 async def handle_track_callback(
-    callback: types.CallbackQuery, callback_data: ActivityCallback, state: FSMContext
+    callback: types.CallbackQuery, callback_data: ActivityCallback, db: AsyncSession
 ):
     """Обрабатывает нажатие на кнопку 'track' (старт/стоп/чекбокс)."""
     if not callback.message:
@@ -89,53 +133,70 @@ async def handle_track_callback(
     activity_id = callback_data.activity_id
     today = datetime.date.today()
 
-    async for session in get_async_session():
-        db: AsyncSession = session
-        activity = await crud.get_activity_by_id(
-            db, user_id=user_id, activity_id=activity_id
-        )
-        if not activity:
-            await callback.answer("Активность не найдена!", show_alert=True)
-            return
+    activity = await crud.get_activity_by_id(
+        db, user_id=user_id, activity_id=activity_id
+    )
+    if not activity:
+        await callback.answer("Активность не найдена!", show_alert=True)
+        return
 
-        log = await crud.get_or_create_log(
+    if activity.type == ActivityType.CHECKBOX:
+        if settings.WRITE_BEHIND_ENABLED:
+            write_behind.toggle_checkbox(user_id, activity_id, today)
+        else:
+            await crud.toggle_checkbox_log(
+                db, user_id=user_id, activity_id=activity_id, log_date=today
+            )
+    elif activity.type == ActivityType.TIME:
+        if settings.WRITE_BEHIND_ENABLED:
+            # Таймеры пишутся сразу в БД, буферизованная перезапись минут не должна
+            # записаться после них и затереть время таймера
+            await write_behind.flush_log(activity_id, today)
+        stopped = await crud.stop_timer(
             db, user_id=user_id, activity_id=activity_id, log_date=today
         )
+        if stopped is None:
+            await crud.start_timer(db, user_id=user_id, activity_id=activity_id)
+
+    # Запись и чтение экрана идут в одной транзакции, она фиксируется до edit
+    await _get_and_show_activities(
+        bot=callback.bot,
+        user_id=user_id,
+        db=db,
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+        after=callback_data.after,
+    )
 
-        if activity.type == ActivityType.CHECKBOX:
-            log.value_bool = not log.value_bool
-            await db.commit()
-        elif activity.type == ActivityType.TIME:
-            user_data = await state.get_data()
-            running_timers = user_data.get("running_timers", {})
-
-            if activity.id in running_timers:
-                start_time = running_timers.pop(activity.id)
-                duration_seconds = time.time() - start_time
-                duration_minutes = round(duration_seconds / 60)
-
-                if log.value_minutes is None:
-                    log.value_minutes = 0
-                log.value_minutes += duration_minutes
-                await db.commit()
-            else:
-                running_timers[activity.id] = time.time()
+    await callback.answer()
 
-            await state.update_data(running_timers=running_timers)
 
-        await _get_and_show_activities(
-            bot=callback.bot,
-            user_id=user_id,
-            state=state,
-            db=session,
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-        )
+@callbacks.register(ActivitiesPageCallback)
+async def handle_activities_page(
+    callback: types.CallbackQuery, callback_data: ActivitiesPageCallback, db: AsyncSession
+):
+    """Переключает страницу клавиатуры активностей."""
+    if not callback.message:
+        await callback.answer()
+        return
 
+    if callback_data.action == "prev":
+        after, before = 0, callback_data.cursor
+    else:
+        after, before = callback_data.cursor, None
+    await _get_and_show_activities(
+        bot=callback.bot,
+        user_id=callback.from_user.id,
+        db=db,
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+        after=after,
+        before=before,
+    )
     await callback.answer()
 
 
-@router.callback_query(ActivityCallback.filter(F.action == "manual_time"))
+@callbacks.register(ActivityCallback, action="manual_time")
 async def handle_manual_time_callback(
     callback: types.CallbackQuery, callback_data: ActivityCallback, state: FSMContext
 ):
@@ -150,13 +211,16 @@ async def handle_manual_time_callback(
     await state.update_data(
         manual_time_activity_id=callback_data.activity_id,
         message_id_to_edit=callback.message.message_id,
+        page_after=callback_data.after,
         prompt_message_id=prompt_message.message_id,
     )
     await callback.answer()
 
 
 @router.message(TrackActivity.waiting_for_manual_time, F.text)
-async def handle_manual_time_input(message: types.Message, state: FSMContext):
+async def handle_manual_time_input(
+    message: types.Message, state: FSMContext, db: AsyncSession
+):
     """Обрабатывает введенное вручную количество минут."""
     if not message.text or not message.text.isdigit() or not message.from_user:
         await message.answer("Пожалуйста, введите целое число.")
@@ -172,23 +236,29 @@ async def handle_manual_time_input(message: types.Message, state: FSMContext):
     await state.set_state(None)
     today = datetime.date.today()
 
-    async for session in get_async_session():
-        db: AsyncSession = session
-        log = await crud.get_or_create_log(
-            db, user_id=user_id, activity_id=activity_id, log_date=today
+    if settings.WRITE_BEHIND_ENABLED:
+        write_behind.set_minutes(user_id, activity_id, today, new_minutes_value)
+    else:
+        await crud.set_log_minutes(
+            db,
+            user_id=user_id,
+            activity_id=activity_id,
+            log_date=today,
+            minutes=new_minutes_value,
         )
-        log.value_minutes = new_minutes_value
-        await db.commit()
 
-        if message_id_to_edit:
-            await _get_and_show_activities(
-                bot=message.bot,
-                user_id=user_id,
-                state=state,
-                db=session,
-                chat_id=message.chat.id,
-                message_id=message_id_to_edit,
-            )
+    if message_id_to_edit:
+        await _get_and_show_activities(
+            bot=message.bot,
+            user_id=user_id,
+            db=db,
+            chat_id=message.chat.id,
+            message_id=message_id_to_edit,
+            after=user_data.get("page_after", 0),
+        )
+    else:
+        # Не держим соединение, пока идут запросы к Telegram
+        await db.commit()
 
     await message.delete()
     if prompt_message_id:
@@ -200,5 +270,7 @@ async def handle_manual_time_input(message: types.Message, state: FSMContext):
             pass
 
     confirm_msg = await message.answer(f"✅ Установлено {new_minutes_value} мин.")
-    await asyncio.sleep(3)
-    await confirm_msg.delete()
+    # Удаляем подтверждение в фоне, чтобы не держать воркер обновлений
+    task = asyncio.create_task(_delete_later(confirm_msg, delay=3))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
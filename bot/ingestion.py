@@ -0,0 +1,137 @@
+"""Модуль с неблокирующим приемом обновлений вебхука через ограниченную очередь."""
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot, Dispatcher, types
+
+logger = logging.getLogger(__name__)
+
+
+def get_chat_key(update: types.Update) -> int:
+    """Возвращает ключ чата обновления, по которому сохраняется порядок обработки."""
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+
+    chat = getattr(event, "chat", None)
+    if chat is None:
+        message = getattr(event, "message", None)
+        chat = getattr(message, "chat", None)
+    if chat is not None:
+        return chat.id
+
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Очередь входящих обновлений с пулом воркеров.
+
+    Вебхук кладет обновление в очередь и сразу отвечает Telegram. Обновления
+    распределяются по воркерам по ключу чата, поэтому внутри одного чата они
+    обрабатываются строго по порядку, а разные чаты - параллельно. Очередь
+    каждого воркера ограничена: при переполнении обновление не принимается,
+    и Telegram повторит его позже.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int, queue_size: int):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self._queues: list[asyncio.Queue[tuple[float, types.Update]]] = [
+            asyncio.Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        self._workers: list[asyncio.Task] = []
+        self._accepting = False
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_wait = 0.0
+        self._total_wait = 0.0
+
+    async def start(self) -> None:
+        """Запускает воркеры и начинает прием обновлений."""
+        self._workers = [
+            asyncio.create_task(self._worker(queue), name=f"update-worker-{i}")
+            for i, queue in enumerate(self._queues)
+        ]
+        self._accepting = True
+        logger.info("Очередь обновлений запущена: %s воркеров", len(self._workers))
+
+    def put_nowait(self, update: types.Update) -> bool:
+        """
+        Кладет обновление в очередь его чата.
+
+        Returns:
+            False, если прием остановлен или очередь чата переполнена.
+        """
+        if not self._accepting:
+            self.rejected += 1
+            return False
+        queue = self._queues[hash(get_chat_key(update)) % len(self._queues)]
+        try:
+            queue.put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def stop(self, timeout: float) -> None:
+        """Прекращает прием и дорабатывает очередь не дольше `timeout` секунд."""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Очередь обновлений не опустела за %s с, осталось %s",
+                timeout,
+                self.depth,
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def depth(self) -> int:
+        """Количество обновлений, ожидающих обработки."""
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self) -> dict[str, int | float | list[int]]:
+        """Возвращает метрики очереди для контроля обратного давления."""
+        return {
+            "depth": self.depth,
+            "depth_per_worker": [queue.qsize() for queue in self._queues],
+            "capacity_per_worker": self._queues[0].maxsize if self._queues else 0,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._total_wait / self.processed * 1000, 2)
+            if self.processed else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+    async def _worker(self, queue: asyncio.Queue[tuple[float, types.Update]]) -> None:
+        while True:
+            enqueued_at, update = await queue.get()
+            wait = time.monotonic() - enqueued_at
+            self._total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            try:
+                await self.dispatcher.feed_update(bot=self.bot, update=update)
+            except Exception:
+                self.failed += 1
+                logger.exception("Ошибка при обработке обновления %s", update.update_id)
+            finally:
+                self.processed += 1
+                queue.task_done()
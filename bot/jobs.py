@@ -0,0 +1,197 @@
+"""Модуль с фоновой очередью долгих задач (экспорт, отчеты)."""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+
+from bot.keyboards.inline import get_job_keyboard
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[["JobContext"], Awaitable[None]]
+
+
+@dataclass(eq=False)
+class Job:
+    """Задача в очереди."""
+    id: int
+    user_id: int
+    title: str
+    func: JobFunc
+    status_message: types.Message | None = None
+    task: asyncio.Task | None = field(default=None, repr=False)
+    cancelled: bool = False
+
+
+class JobContext:
+    """Контекст выполняющейся задачи: сообщения о прогрессе."""
+
+    # Не чаще одного редактирования статуса за этот интервал (секунды)
+    PROGRESS_INTERVAL = 2.0
+
+    def __init__(self, job: Job):
+        self.job = job
+        self._last_progress = 0.0
+
+    async def progress(self, text: str, force: bool = False) -> None:
+        """Показывает прогресс в статусном сообщении задачи."""
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        await _edit_status(self.job, f"⏳ {self.job.title}: {text}", with_cancel=True)
+
+    async def finish(self, text: str) -> None:
+        """Заменяет статусное сообщение итоговым текстом (без кнопки отмены)."""
+        await _edit_status(self.job, text)
+
+
+async def _edit_status(job: Job, text: str, with_cancel: bool = False) -> None:
+    if not job.status_message:
+        return
+    try:
+        await job.status_message.edit_text(
+            text, reply_markup=get_job_keyboard(job.id) if with_cancel else None
+        )
+    except TelegramBadRequest:
+        # Сообщение не изменилось или уже удалено - прогресс не критичен
+        pass
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач с ограниченным пулом воркеров.
+
+    Обработчики ставят задачу и сразу возвращаются, поэтому долгий экспорт
+    не держит открытым запрос вебхука. У пользователя может быть не больше
+    `per_user_limit` задач одновременно (в очереди и в работе).
+    """
+
+    def __init__(self, workers: int, per_user_limit: int, max_queued: int):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=max_queued)
+        self._jobs: dict[int, Job] = {}
+        self._user_jobs: defaultdict[int, set[int]] = defaultdict(set)
+        self._ids = itertools.count(1)
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Запускает воркеры."""
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Очередь задач запущена: %s воркеров", self.workers)
+
+    async def stop(self, timeout: float | None = None) -> None:
+        """Дает задачам завершиться за `timeout` секунд, затем отменяет оставшиеся."""
+        timeout = settings.JOB_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не все задачи успели завершиться, отменяем оставшиеся")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(
+        self,
+        user_id: int,
+        title: str,
+        func: JobFunc,
+        status_message: types.Message | None = None,
+    ) -> Job | None:
+        """
+        Ставит задачу в очередь.
+
+        Returns:
+            Задачу или None, если превышен лимит задач пользователя
+            или очередь переполнена.
+        """
+        if len(self._user_jobs[user_id]) >= self.per_user_limit or self._queue.full():
+            return None
+
+        job = Job(
+            id=next(self._ids),
+            user_id=user_id,
+            title=title,
+            func=func,
+            status_message=status_message,
+        )
+        self._jobs[job.id] = job
+        self._user_jobs[user_id].add(job.id)
+        self._queue.put_nowait(job)
+        await _edit_status(job, f"⏳ {title}: в очереди...", with_cancel=True)
+        return job
+
+    async def join(self) -> None:
+        """Ждет, пока все поставленные задачи будут выполнены."""
+        await self._queue.join()
+
+    def cancel(self, job_id: int, user_id: int) -> bool:
+        """Отменяет задачу пользователя (в очереди или в работе)."""
+        job = self._jobs.get(job_id)
+        if not job or job.user_id != user_id:
+            return False
+        job.cancelled = True
+        if job.task:
+            job.task.cancel()
+        return True
+
+    def stats(self) -> dict[str, int]:
+        """Возвращает размер очереди и количество задач в работе."""
+        return {
+            "queued": self._queue.qsize(),
+            "active": len(self._jobs),
+            "workers": len(self._workers),
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.cancelled:
+                    await self._run(job)
+                else:
+                    await _edit_status(job, f"❌ {job.title}: отменено.")
+            finally:
+                self._jobs.pop(job.id, None)
+                self._user_jobs[job.user_id].discard(job.id)
+                if not self._user_jobs[job.user_id]:
+                    del self._user_jobs[job.user_id]
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        context = JobContext(job)
+        await context.progress("выполняется...", force=True)
+        job.task = asyncio.create_task(job.func(context))
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                # Отменили сам воркер (остановка приложения)
+                job.task.cancel()
+                raise
+            await _edit_status(job, f"❌ {job.title}: отменено.")
+        except Exception:
+            logger.exception("Ошибка в задаче %s", job.title)
+            await _edit_status(job, f"⚠️ {job.title}: произошла ошибка.")
+
+
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    per_user_limit=settings.JOB_PER_USER_LIMIT,
+    max_queued=settings.JOB_QUEUE_SIZE,
+)
@@ -9,9 +9,23 @@ class ActivityCallback(CallbackData, prefix="activity"):
 
     - action: 'track' (старт/стоп), 'manual_time' (ручной ввод)
     - activity_id: ID активности
+    - after: курсор страницы, на которой кнопка (см. ActivitiesPageCallback)
     """
     action: str
     activity_id: int
+    after: int = 0
+
+
+class ActivitiesPageCallback(CallbackData, prefix="activities"):
+    """
+    CallbackData для перехода между страницами клавиатуры активностей.
+
+    - action: 'next' (вперед), 'prev' (назад)
+    - cursor: для 'next' - ID последней активности текущей страницы,
+      для 'prev' - ID первой
+    """
+    action: str
+    cursor: int
 
 
 class CalendarCallback(CallbackData, prefix="calendar"):
@@ -27,3 +41,14 @@ class CalendarCallback(CallbackData, prefix="calendar"):
     year: int
     month: int
     day: int | None = None
+
+
+class JobCallback(CallbackData, prefix="job"):
+    """
+    CallbackData для управления фоновыми задачами.
+
+    - action: 'cancel' (отмена задачи)
+    - job_id: ID задачи в очереди
+    """
+    action: str
+    job_id: int
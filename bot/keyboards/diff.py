@@ -0,0 +1,72 @@
+"""Модуль для пропуска повторной отправки неизменившихся inline-клавиатур."""
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import InlineKeyboardMarkup
+
+from core.cache import LRUCache
+from core.config import settings
+
+Fingerprint = tuple[tuple[tuple[str, str | None], ...], ...]
+
+
+def keyboard_fingerprint(markup: InlineKeyboardMarkup) -> Fingerprint:
+    """Возвращает отпечаток клавиатуры: тексты кнопок и их callback-данные."""
+    return tuple(
+        tuple((button.text, button.callback_data) for button in row)
+        for row in markup.inline_keyboard
+    )
+
+
+class MarkupFingerprints(BaseRequestMiddleware):
+    """
+    Отпечатки последних отправленных клавиатур по сообщениям.
+
+    Если новая клавиатура совпадает с последней отправленной в это сообщение,
+    редактирование можно пропустить: Telegram все равно ответит
+    "message is not modified", а запрос потратит лимит.
+
+    Как middleware сессии бота забывает отпечаток при любом запросе
+    к сообщению (редактирование, удаление): после чужого изменения сообщения
+    пропуск был бы ошибкой. Изменения из других процессов не видны, поэтому
+    при нескольких процессах пропуск выключается (`maxsize=0`).
+    """
+
+    def __init__(self, maxsize: int):
+        self.enabled = maxsize > 0
+        self._cache = LRUCache(maxsize=max(maxsize, 1))
+
+    def is_unchanged(self, chat_id: int, message_id: int, markup: InlineKeyboardMarkup) -> bool:
+        """Проверяет, совпадает ли клавиатура с последней отправленной в сообщение."""
+        if not self.enabled:
+            return False
+        return self._cache.get((chat_id, message_id)) == keyboard_fingerprint(markup)
+
+    def remember(self, chat_id: int, message_id: int, markup: InlineKeyboardMarkup) -> None:
+        """Запоминает клавиатуру, отправленную в сообщение."""
+        if self.enabled:
+            self._cache.set((chat_id, message_id), keyboard_fingerprint(markup))
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        chat_id = getattr(method, "chat_id", None)
+        message_id = getattr(method, "message_id", None)
+        if chat_id is not None and message_id is not None:
+            # Отправитель клавиатуры запомнит ее заново после своего запроса
+            self._cache.pop((chat_id, message_id))
+        return await make_request(bot, method)
+
+    def stats(self) -> dict[str, int | float]:
+        """Возвращает счетчики кэша (попадание - пропущенное редактирование)."""
+        return self._cache.stats()
+
+
+markup_fingerprints = MarkupFingerprints(maxsize=settings.KEYBOARD_FINGERPRINTS_SIZE)
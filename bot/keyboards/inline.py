@@ -1,10 +1,19 @@
 """Модуль с inline-клавиатурами."""
+import asyncio
 import calendar
+import functools
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from bot.keyboards.callback_data import ActivityCallback, CalendarCallback
-from db.models import Activity, ActivityLog, ActivityType
+from bot.keyboards.callback_data import (
+    ActivitiesPageCallback,
+    ActivityCallback,
+    CalendarCallback,
+    JobCallback,
+)
+from core.config import settings
+from db.models import ActivityType
+from db.read_models import ActivitiesPage
 
 
 def get_activity_type_keyboard() -> InlineKeyboardMarkup:
@@ -19,62 +28,92 @@ def get_activity_type_keyboard() -> InlineKeyboardMarkup:
     return keyboard
 
 
-async def get_activities_keyboard(
-    activities: list[Activity],
-    today_logs: dict[int, ActivityLog],
-    running_timers: dict[int, int],
-) -> InlineKeyboardMarkup:
+async def get_activities_keyboard(page: ActivitiesPage) -> InlineKeyboardMarkup:
     """
-    Создает и возвращает клавиатуру со списком активностей.
-    
+    Создает и возвращает клавиатуру со страницей активностей и кнопками
+    перехода между страницами.
+    Строки кнопок кэшируются по их содержимому, поэтому заново собираются
+    только строки изменившихся активностей.
+
     Args:
-        activities: Список объектов Activity.
-        today_logs: Словарь с логами за сегодня, где ключ - ID активности.
-        running_timers: Словарь с запущенными таймерами {activity_id: start_timestamp}.
+        page: Страница экрана активностей (активность, значение за сегодня, таймер).
     """
-    buttons = []
-    for activity in activities:
-        log = today_logs.get(activity.id)
-        button_row = []
-        
-        if activity.type == ActivityType.CHECKBOX:
-            status_icon = "✅" if log and log.value_bool else "☑️"
-            button_text = f"{status_icon} {activity.name}"
-            callback_data = ActivityCallback(action="track", activity_id=activity.id).pack()
-            button_row.append(
-                InlineKeyboardButton(text=button_text, callback_data=callback_data)
-            )
-
-        elif activity.type == ActivityType.TIME:
-            is_running = activity.id in running_timers
-            status_icon = "⏹️" if is_running else "▶️"
-            total_minutes = log.value_minutes if log and log.value_minutes else 0
-            button_text = f"{status_icon} {activity.name} ({total_minutes} мин.)"
-            
-            # Кнопка для старт/стоп
-            button_row.append(InlineKeyboardButton(
-                text=button_text,
-                callback_data=ActivityCallback(action="track", activity_id=activity.id).pack()
-            ))
-            # Кнопка для ручного ввода
-            button_row.append(InlineKeyboardButton(
-                text="✏️",
-                callback_data=ActivityCallback(action="manual_time", activity_id=activity.id).pack()
-            ))
-            
-        else:
-            button_text = activity.name
-            callback_data = ActivityCallback(action="track", activity_id=activity.id).pack()
-            button_row.append(
-                InlineKeyboardButton(text=button_text, callback_data=callback_data)
-            )
-
-        buttons.append(button_row)
-    
+    buttons = [
+        list(_activity_row_buttons(
+            row.id,
+            row.name,
+            row.type,
+            bool(row.value_bool),
+            row.value_minutes or 0,
+            row.is_running,
+            page.after,
+        ))
+        for row in page.rows
+    ]
+    navigation = []
+    if page.has_prev:
+        navigation.append(InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=ActivitiesPageCallback(action="prev", cursor=page.rows[0].id).pack(),
+        ))
+    if page.has_next:
+        navigation.append(InlineKeyboardButton(
+            text="Вперед ▶️",
+            callback_data=ActivitiesPageCallback(action="next", cursor=page.rows[-1].id).pack(),
+        ))
+    if navigation:
+        buttons.append(navigation)
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     return keyboard
 
 
+@functools.lru_cache(maxsize=settings.KEYBOARD_ROWS_CACHE_SIZE)
+def _activity_row_buttons(
+    activity_id: int,
+    name: str,
+    type: ActivityType,
+    checked: bool,
+    total_minutes: int,
+    is_running: bool,
+    after: int,
+) -> tuple[InlineKeyboardButton, ...]:
+    """
+    Собирает кнопки строки одной активности (результат кэшируется).
+    `after` - курсор страницы: после нажатия показывается та же страница.
+    """
+    button_row = []
+    track_data = ActivityCallback(action="track", activity_id=activity_id, after=after).pack()
+
+    if type == ActivityType.CHECKBOX:
+        status_icon = "✅" if checked else "☑️"
+        button_text = f"{status_icon} {name}"
+        button_row.append(
+            InlineKeyboardButton(text=button_text, callback_data=track_data)
+        )
+
+    elif type == ActivityType.TIME:
+        status_icon = "⏹️" if is_running else "▶️"
+        button_text = f"{status_icon} {name} ({total_minutes} мин.)"
+
+        # Кнопка для старт/стоп
+        button_row.append(InlineKeyboardButton(text=button_text, callback_data=track_data))
+        # Кнопка для ручного ввода
+        button_row.append(InlineKeyboardButton(
+            text="✏️",
+            callback_data=ActivityCallback(
+                action="manual_time", activity_id=activity_id, after=after
+            ).pack()
+        ))
+
+    else:
+        button_text = name
+        button_row.append(
+            InlineKeyboardButton(text=button_text, callback_data=track_data)
+        )
+
+    return tuple(button_row)
+
+
 def get_stats_period_keyboard() -> InlineKeyboardMarkup:
     """Возвращает клавиатуру для выбора периода статистики."""
     buttons = [
@@ -91,9 +130,67 @@ def get_stats_period_keyboard() -> InlineKeyboardMarkup:
     return keyboard
 
 
+def get_job_keyboard(job_id: int) -> InlineKeyboardMarkup:
+    """Возвращает клавиатуру с кнопкой отмены фоновой задачи."""
+    buttons = [
+        [
+            InlineKeyboardButton(
+                text="Отменить",
+                callback_data=JobCallback(action="cancel", job_id=job_id).pack(),
+            ),
+        ]
+    ]
+    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    return keyboard
+
+
 async def create_calendar_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
-    """Создает inline-клавиатуру с календарем на указанный месяц и год."""
-    
+    """
+    Возвращает inline-клавиатуру с календарем на указанный месяц и год.
+
+    Клавиатуры берутся из ограниченного кэша: они зависят только от
+    (year, month). При `CALENDAR_PREFETCH` соседние месяцы строятся заранее,
+    чтобы навигация "<"/">" не тратила время на сборку кнопок.
+    """
+    keyboard = _build_calendar_keyboard(year, month)
+    if settings.CALENDAR_PREFETCH:
+        loop = asyncio.get_running_loop()
+        for neighbor in _neighbor_months(year, month):
+            loop.call_soon(_build_calendar_keyboard, *neighbor)
+    return keyboard
+
+
+def calendar_cache_stats() -> dict[str, int]:
+    """Возвращает счетчики кэша клавиатур-календарей."""
+    info = _build_calendar_keyboard.cache_info()
+    return {
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+    }
+
+
+def _neighbor_months(year: int, month: int) -> tuple[tuple[int, int], tuple[int, int]]:
+    """Возвращает (год, месяц) предыдущего и следующего месяцев."""
+    prev_month = month - 1
+    prev_year = year
+    if prev_month == 0:
+        prev_month = 12
+        prev_year -= 1
+
+    next_month = month + 1
+    next_year = year
+    if next_month == 13:
+        next_month = 1
+        next_year += 1
+
+    return (prev_year, prev_month), (next_year, next_month)
+
+
+@functools.lru_cache(maxsize=settings.CALENDAR_CACHE_SIZE)
+def _build_calendar_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
+    """Создает inline-клавиатуру с календарем (результат кэшируется)."""
     # Названия месяцев на русском
     month_names = [
         "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
@@ -133,18 +230,8 @@ async def create_calendar_keyboard(year: int, month: int) -> InlineKeyboardMarku
         inline_keyboard.append(row)
 
     # Последняя строка: Навигация
-    prev_month = month - 1
-    prev_year = year
-    if prev_month == 0:
-        prev_month = 12
-        prev_year -= 1
+    (prev_year, prev_month), (next_year, next_month) = _neighbor_months(year, month)
 
-    next_month = month + 1
-    next_year = year
-    if next_month == 13:
-        next_month = 1
-        next_year += 1
-        
     inline_keyboard.append([
         InlineKeyboardButton(
             text="<",
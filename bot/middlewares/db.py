@@ -0,0 +1,39 @@
+"""Middleware с одной сессией базы данных на обновление."""
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Внешний middleware, который передает обработчикам сессию БД в аргументе `db`.
+
+    Сессия создается на каждое обновление, но соединение из пула берется
+    только при первом запросе. В конце обработки транзакция фиксируется один
+    раз, при исключении - откатывается. Перед долгими запросами к Telegram
+    обработчик может сам вызвать `db.commit()`: соединение вернется в пул,
+    а следующий запрос возьмет его снова.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with self.session_factory() as session:
+            data["db"] = session
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await session.rollback()
+                raise
+            if session.in_transaction():
+                await session.commit()
+            return result
@@ -0,0 +1,37 @@
+"""Middleware с учетом запросов к БД по обработчикам."""
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from db.instrumentation import begin_update, end_update
+
+
+def _handler_name(data: dict[str, Any]) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "unknown"
+    module = callback.__module__.rsplit(".", 1)[-1]
+    return f"{module}.{callback.__qualname__}"
+
+
+class QueryCounterMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware, который помечает запросы к БД именем обработчика
+    и считает, сколько запросов выполнено за обновление.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = _handler_name(data)
+        queries, tokens = begin_update(name)
+        try:
+            return await handler(event, data)
+        finally:
+            end_update(name, queries, tokens)
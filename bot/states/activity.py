@@ -26,3 +26,7 @@ class Stats(StatesGroup):
     choosing_start_date = State()
     choosing_end_date = State()
 
+
+class ImportData(StatesGroup):
+    """Состояния для процесса импорта логов из файлов."""
+    waiting_for_file = State()
@@ -0,0 +1,197 @@
+"""Модуль с FSM-хранилищем с горячим слоем в памяти и пакетной записью."""
+
+import asyncio
+import copy
+import datetime
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Mapping, Protocol
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(data: Mapping[str, Any]) -> str:
+    """Сериализует данные FSM в JSON, сохраняя даты (их кладут календарные сценарии)."""
+    return json.dumps(data, default=_encode_value, ensure_ascii=False)
+
+
+def loads(raw: str | bytes) -> dict[str, Any]:
+    """Десериализует данные FSM из JSON, восстанавливая даты."""
+    return json.loads(raw, object_hook=_decode_value)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается в данных FSM")
+
+
+def _decode_value(obj: dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "__date__" in obj:
+            return datetime.date.fromisoformat(obj["__date__"])
+        if "__datetime__" in obj:
+            return datetime.datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+@dataclass(slots=True)
+class Record:
+    """Состояние и данные FSM одного ключа."""
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+
+
+class StorageBackend(Protocol):
+    """Долговременное хранилище записей FSM."""
+
+    async def load(self, key: str) -> Record | None:
+        """Читает запись по ключу."""
+
+    async def write_many(self, records: dict[str, Record]) -> None:
+        """Записывает пакет записей; пустая запись означает удаление ключа."""
+
+    async def close(self) -> None:
+        """Закрывает соединения."""
+
+
+class BufferedStorage(BaseStorage):
+    """
+    FSM-хранилище с горячим слоем в памяти поверх долговременного бэкенда.
+
+    Чтения обслуживаются из памяти, пока запись свежее `cache_ttl`
+    (или пока в ней есть несброшенные изменения). Изменения копятся
+    и сбрасываются в бэкенд пакетами раз в `flush_interval` секунд или
+    при накоплении `batch_size` ключей. При `flush_interval=0` (режим
+    нескольких процессов) запись идет сразу, а чтения всегда идут в бэкенд:
+    иначе процесс видел бы изменения других процессов с опозданием
+    до `cache_ttl`.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        flush_interval: float = 0.1,
+        batch_size: int = 100,
+        cache_ttl: float = 5.0,
+        cache_size: int = 10000,
+    ):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # Без буферизации хранилище общее для процессов, кэш чтений отключаем
+        self.cache_ttl = cache_ttl if flush_interval > 0 else 0.0
+        self.cache_size = cache_size
+        self.key_builder = DefaultKeyBuilder()
+        self._hot: OrderedDict[str, tuple[float, Record]] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_wakeup = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._closed = False
+
+    async def _get_record(self, key: str) -> Record:
+        item = self._hot.get(key)
+        if item is not None:
+            loaded_at, record = item
+            if key in self._dirty or time.monotonic() - loaded_at < self.cache_ttl:
+                self._hot.move_to_end(key)
+                return record
+
+        record = await self.backend.load(key) or Record()
+        # Пока шло чтение, запись могли изменить - локальные изменения важнее.
+        if key in self._dirty:
+            return self._hot[key][1]
+        self._remember(key, record)
+        return record
+
+    def _remember(self, key: str, record: Record) -> None:
+        self._hot[key] = (time.monotonic(), record)
+        self._hot.move_to_end(key)
+        if len(self._hot) > self.cache_size:
+            for old_key in list(self._hot):
+                if len(self._hot) <= self.cache_size:
+                    break
+                if old_key not in self._dirty:
+                    del self._hot[old_key]
+
+    async def _write(self, key: str, record: Record) -> None:
+        if self._closed:
+            await self.backend.write_many({key: record})
+            return
+
+        self._remember(key, record)
+        self._dirty.add(key)
+        if self.flush_interval <= 0:
+            await self.flush()
+            return
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.batch_size:
+            self._flush_wakeup.set()
+
+    async def _flush_loop(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось сбросить данные FSM в хранилище")
+
+    async def flush(self) -> None:
+        """Сбрасывает все несохраненные изменения в бэкенд одним пакетом."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # Записи в горячем слое не изменяются на месте, их можно отдавать как есть.
+            batch = {key: self._hot[key][1] for key in self._dirty}
+            self._dirty.clear()
+            try:
+                await self.backend.write_many(batch)
+            except Exception:
+                # Возвращаем ключи в очередь, если их не перезаписали заново.
+                self._dirty.update(batch)
+                raise
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        new_state = state.state if isinstance(state, State) else state
+        await self._write(storage_key, Record(state=new_state, data=record.data))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = await self._get_record(self.key_builder.build(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        await self._write(
+            storage_key, Record(state=record.state, data=copy.deepcopy(dict(data)))
+        )
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = await self._get_record(self.key_builder.build(key))
+        return copy.deepcopy(record.data)
+
+    async def close(self) -> None:
+        """Останавливает фоновый сброс, дописывает изменения и закрывает бэкенд."""
+        self._closed = True
+        if self._flusher is not None:
+            self._flush_wakeup.set()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        await self.flush()
+        await self.backend.close()
@@ -0,0 +1,38 @@
+"""Модуль для создания FSM-хранилища по настройкам проекта."""
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.storage.base import BufferedStorage
+from core.config import Settings
+
+
+def create_storage(settings: Settings) -> BaseStorage:
+    """
+    Создает FSM-хранилище, выбранное в `FSM_STORAGE`.
+
+    - memory: хранилище aiogram в памяти (состояния теряются при перезапуске);
+    - sqlite: локальный файл SQLite в режиме WAL (по умолчанию);
+    - redis: сервер с протоколом Redis, общий для нескольких процессов.
+    """
+    match settings.FSM_STORAGE:
+        case "memory":
+            return MemoryStorage()
+        case "sqlite":
+            from bot.storage.sqlite import SQLiteBackend
+
+            backend = SQLiteBackend(settings.FSM_SQLITE_PATH)
+        case "redis":
+            from bot.storage.redis import RedisBackend
+
+            backend = RedisBackend(settings.FSM_REDIS_URL)
+        case _:
+            raise ValueError(f"Неизвестное FSM-хранилище: {settings.FSM_STORAGE}")
+
+    return BufferedStorage(
+        backend,
+        flush_interval=settings.FSM_FLUSH_INTERVAL_MS / 1000,
+        batch_size=settings.FSM_FLUSH_BATCH_SIZE,
+        cache_ttl=settings.FSM_CACHE_TTL,
+        cache_size=settings.FSM_CACHE_SIZE,
+    )
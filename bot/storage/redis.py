@@ -0,0 +1,50 @@
+"""Модуль с бэкендом FSM-хранилища, работающим по протоколу Redis."""
+
+from typing import Any
+
+from bot.storage.base import Record, dumps, loads
+
+
+class RedisBackend:
+    """
+    Хранит записи FSM в Redis (или любом сервере с протоколом Redis) как хэши
+    `{state, data}`. Пакет изменений отправляется одним pipeline.
+
+    Требует необязательную зависимость `redis` (`pip install tracker-bot[redis]`).
+    """
+
+    def __init__(self, url: str, ttl: int | None = None):
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise RuntimeError(
+                "Для FSM_STORAGE=redis установите пакет redis: pip install 'redis>=5'"
+            ) from e
+        self.redis: Any = Redis.from_url(url)
+        self.ttl = ttl
+
+    async def load(self, key: str) -> Record | None:
+        values = await self.redis.hmget(key, "state", "data")
+        state, data = values
+        if state is None and data is None:
+            return None
+        if isinstance(state, bytes):
+            state = state.decode("utf-8")
+        return Record(state=state or None, data=loads(data) if data else {})
+
+    async def write_many(self, records: dict[str, Record]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, record in records.items():
+                pipe.delete(key)
+                if record.state is None and not record.data:
+                    continue
+                pipe.hset(
+                    key,
+                    mapping={"state": record.state or "", "data": dumps(record.data)},
+                )
+                if self.ttl:
+                    pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self.redis.aclose()
@@ -0,0 +1,72 @@
+"""Модуль с бэкендом FSM-хранилища на локальном файле SQLite в режиме WAL."""
+
+import time
+
+import aiosqlite
+
+from bot.storage.base import Record, dumps, loads
+
+
+class SQLiteBackend:
+    """Хранит записи FSM в отдельном файле SQLite (WAL, synchronous=NORMAL)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: aiosqlite.Connection | None = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            connection = await aiosqlite.connect(self.path)
+            await connection.execute("PRAGMA journal_mode=WAL")
+            await connection.execute("PRAGMA synchronous=NORMAL")
+            await connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fsm_records (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            await connection.commit()
+            self._connection = connection
+        return self._connection
+
+    async def load(self, key: str) -> Record | None:
+        connection = await self._connect()
+        async with connection.execute(
+            "SELECT state, data FROM fsm_records WHERE key = ?", (key,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return Record(state=row[0], data=loads(row[1]))
+
+    async def write_many(self, records: dict[str, Record]) -> None:
+        connection = await self._connect()
+        now = time.time()
+        upserts = [
+            (key, record.state, dumps(record.data), now)
+            for key, record in records.items()
+            if record.state is not None or record.data
+        ]
+        deletes = [
+            (key,)
+            for key, record in records.items()
+            if record.state is None and not record.data
+        ]
+        if upserts:
+            await connection.executemany(
+                "INSERT OR REPLACE INTO fsm_records (key, state, data, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                upserts,
+            )
+        if deletes:
+            await connection.executemany("DELETE FROM fsm_records WHERE key = ?", deletes)
+        await connection.commit()
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
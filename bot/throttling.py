@@ -0,0 +1,245 @@
+"""Модуль с ограничением частоты исходящих запросов к Telegram Bot API."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText, Response, TelegramMethod
+
+from core.cache import LRUCache
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Редактирования, которые можно схлопывать: важен только последний вариант
+COALESCED_METHODS = (EditMessageReplyMarkup, EditMessageText)
+
+
+class TokenBucket:
+    """
+    Корзина токенов: не больше `rate` запросов в секунду с запасом `capacity`.
+
+    Токены резервируются сразу при вызове `reserve`, поэтому ожидающие
+    запросы проходят в порядке очереди без дополнительной блокировки.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    def reserve(self) -> float:
+        """Резервирует токен и возвращает, сколько секунд нужно подождать."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        """Запрещает запросы на указанное время (ответ Telegram с retry_after)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+@dataclass(slots=True)
+class _PendingEdit:
+    """Ожидающее отправки редактирование сообщения."""
+    method: TelegramMethod
+    future: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    waiters: int = 0
+
+
+class OutboundThrottler(BaseRequestMiddleware):
+    """
+    Middleware сессии бота, ограничивающий частоту исходящих запросов.
+
+    Запросы к чатам проходят через общую корзину токенов и корзину своего чата.
+    При ответе 429 корзина блокируется на `retry_after`, и запрос повторяется.
+    Повторные редактирования одного и того же сообщения, ожидающие отправки,
+    схлопываются в последнее: все вызывающие получают результат одного запроса.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: float,
+        max_retries: int,
+        max_chats: int,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chat_buckets = LRUCache(maxsize=max_chats)
+        self._pending_edits: dict[tuple, _PendingEdit] = {}
+        # Ссылки на фоновые отправки, чтобы их не собрал сборщик мусора
+        self._background_tasks: set[asyncio.Task] = set()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.total_wait = 0.0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # Запросы вне чатов (ответы на callback, настройки вебхука) не ограничиваем
+            return await make_request(bot, method)
+
+        if isinstance(method, COALESCED_METHODS) and method.message_id is not None:
+            return await self._send_edit(make_request, bot, method, chat_id)
+        return await self._send(make_request, bot, method, chat_id)
+
+    async def _send_edit(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        chat_id: int | str,
+    ) -> Response:
+        """Отправляет редактирование, схлопывая его с уже ожидающим для того же сообщения."""
+        key = (type(method), chat_id, method.message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            # Заменяем ожидающее редактирование последним вариантом
+            pending.method = method
+            pending.waiters += 1
+            self.coalesced += 1
+            return await asyncio.shield(pending.future)
+
+        pending = _PendingEdit(method=method)
+        self._pending_edits[key] = pending
+        try:
+            try:
+                await self._wait_turn(chat_id)
+            finally:
+                # Дальше редактирование уже уходит, новые вызовы ждут следующей очереди
+                del self._pending_edits[key]
+            response = await self._send(make_request, bot, pending.method, chat_id, acquired=True)
+        except asyncio.CancelledError:
+            if pending.waiters:
+                # Отменен только этот вызов: редактирование за схлопнутые вызовы
+                # отправляется в фоне, иначе они ждали бы его вечно
+                self._hand_off_edit(make_request, bot, pending, chat_id)
+            raise
+        except BaseException as e:
+            if pending.waiters:
+                pending.future.set_exception(e)
+            raise
+        if pending.waiters:
+            pending.future.set_result(response)
+        return response
+
+    def _hand_off_edit(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        pending: _PendingEdit,
+        chat_id: int | str,
+    ) -> None:
+        async def send() -> None:
+            try:
+                response = await self._send(make_request, bot, pending.method, chat_id)
+            except asyncio.CancelledError:
+                pending.future.cancel()
+                raise
+            except BaseException as e:
+                pending.future.set_exception(e)
+            else:
+                pending.future.set_result(response)
+
+        task = asyncio.create_task(send())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _send(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        chat_id: int | str,
+        acquired: bool = False,
+    ) -> Response:
+        """Отправляет запрос в пределах лимитов, повторяя его после 429."""
+        attempt = 0
+        while True:
+            if not acquired:
+                await self._wait_turn(chat_id)
+            acquired = False
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.retries += 1
+                self._chat_bucket(chat_id).block(e.retry_after)
+                if attempt > self.max_retries:
+                    raise
+                logger.warning(
+                    "Превышен лимит запросов к чату %s, повтор через %s с.",
+                    chat_id, e.retry_after,
+                )
+                continue
+            self.sent += 1
+            return response
+
+    async def _wait_turn(self, chat_id: int | str) -> None:
+        """Ждет, пока запрос к чату укладывается в лимиты чата и общий лимит."""
+        wait = max(self._chat_bucket(chat_id).reserve(), self.global_bucket.reserve())
+        if wait <= 0:
+            return
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        self.total_wait += wait
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        """Возвращает корзину токенов чата, создавая ее при первом запросе."""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    def stats(self) -> dict[str, int | float]:
+        """Возвращает метрики исходящих запросов."""
+        return {
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "pending_edits": len(self._pending_edits),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "total_wait": round(self.total_wait, 3),
+            "chats": len(self._chat_buckets),
+        }
+
+
+outbound_throttler = OutboundThrottler(
+    global_rate=settings.OUTBOUND_GLOBAL_RATE,
+    chat_rate=settings.OUTBOUND_CHAT_RATE,
+    chat_burst=settings.OUTBOUND_CHAT_BURST,
+    max_retries=settings.OUTBOUND_MAX_RETRIES,
+    max_chats=settings.OUTBOUND_CHAT_BUCKETS,
+)
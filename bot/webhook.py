@@ -0,0 +1,56 @@
+"""
+Модуль с разбором входящих запросов вебхука.
+
+Тело запроса разбирается в `Update` за один проход прямо из байтов
+(`model_validate_json`) и сразу привязывается к боту: иначе `dp.feed_update`
+пересоздает обновление через `model_dump` еще раз. Секрет из заголовка
+`X-Telegram-Bot-Api-Secret-Token` проверяется до чтения тела.
+"""
+
+import hmac
+from typing import Any, Callable
+
+from aiogram import Bot, types
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def is_valid_secret(received: str | None, secret: str | None) -> bool:
+    """Проверяет секрет вебхука; без настроенного секрета пропускает все запросы."""
+    if not secret:
+        return True
+    if received is None:
+        return False
+    return hmac.compare_digest(received.encode(), secret.encode())
+
+
+def _json_loader(backend: str) -> Callable[[bytes], Any] | None:
+    """Возвращает функцию разбора JSON или None для разбора средствами pydantic."""
+    if backend == "pydantic":
+        return None
+    try:
+        import orjson
+    except ImportError as e:
+        raise RuntimeError(
+            "Для WEBHOOK_JSON_BACKEND=orjson установите пакет orjson: "
+            "pip install 'orjson>=3.10'"
+        ) from e
+    return orjson.loads
+
+
+class UpdateParser:
+    """Разбирает тело запроса вебхука в `Update`, привязанный к боту."""
+
+    def __init__(self, bot: Bot, backend: str = "pydantic"):
+        self.context = {"bot": bot}
+        self._loads = _json_loader(backend)
+
+    def parse(self, body: bytes) -> types.Update:
+        """
+        Raises:
+            ValueError: тело - не JSON или не обновление Telegram
+                (ошибки pydantic и orjson - подклассы ValueError).
+        """
+        if self._loads is None:
+            return types.Update.model_validate_json(body, context=self.context)
+        return types.Update.model_validate(self._loads(body), context=self.context)
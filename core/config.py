@@ -1,5 +1,7 @@
 """Модуль настроек проекта."""
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,6 +12,78 @@ class Settings(BaseSettings):
     Аттрибуты:
         bot_token (str): Токен Telegram-бота.
         db_url (str): URL для подключения к базе данных.
+        ACTIVITY_CACHE_SIZE (int): Сколько пользователей держать в кэше активностей.
+        ACTIVITY_CACHE_TTL (float): Время жизни записи кэша активностей в секундах.
+        FSM_STORAGE (str): Хранилище состояний FSM: memory, sqlite или redis.
+        FSM_SQLITE_PATH (str): Путь к файлу SQLite для хранилища FSM.
+        FSM_REDIS_URL (str): URL сервера Redis для хранилища FSM.
+        FSM_FLUSH_INTERVAL_MS (int): Период пакетной записи FSM (0 - писать сразу).
+        FSM_FLUSH_BATCH_SIZE (int): Количество ключей, при котором пакет пишется досрочно.
+        FSM_CACHE_TTL (float): Сколько секунд состояние читается из памяти без обращения
+            к хранилищу. При FSM_FLUSH_INTERVAL_MS=0 не действует: состояние всегда
+            читается из хранилища.
+        FSM_CACHE_SIZE (int): Количество ключей FSM в памяти.
+        EXPORT_ZIP_MIN_DAYS (int): С какой длины периода экспорт отправляется одним ZIP-архивом.
+        EXPORT_SPOOL_MAX_BYTES (int): Размер архива, после которого он пишется во временный
+            файл на диске.
+        JOB_WORKERS (int): Количество воркеров фоновой очереди задач.
+        JOB_PER_USER_LIMIT (int): Сколько задач пользователь может запустить одновременно.
+        JOB_QUEUE_SIZE (int): Максимальное количество задач в очереди.
+        JOB_SHUTDOWN_TIMEOUT (float): Сколько секунд ждать завершения задач при остановке.
+        WEBHOOK_MODE (str): inline - обрабатывать обновление внутри запроса вебхука,
+            queue - сразу отвечать и обрабатывать через очередь.
+        WEBHOOK_WORKERS (int): Количество воркеров очереди обновлений.
+        WEBHOOK_QUEUE_SIZE (int): Размер очереди одного воркера.
+        WEBHOOK_DRAIN_TIMEOUT (float): Сколько секунд дорабатывать очередь при остановке.
+        WEBHOOK_SECRET (str | None): Секрет вебхука: передается Telegram при установке
+            вебхука и сверяется с заголовком X-Telegram-Bot-Api-Secret-Token.
+        WEBHOOK_JSON_BACKEND (str): Чем разбирать тело вебхука: pydantic или orjson
+            (необязательная зависимость).
+        DEDUP_WINDOW (int): Сколько последних update_id помнить для отсечения повторов.
+        DEDUP_STATE_PATH (str | None): Файл для сохранения окна update_id между запусками.
+        STATS_CACHE_SIZE (int): Сколько отрисованных ответов статистики держать в кэше.
+        STATS_CACHE_TTL (float): Время жизни ответа статистики в кэше в секундах. Кэш
+            у каждого процесса свой: после записи через другой процесс ответ может
+            быть устаревшим до этого времени.
+        CALENDAR_CACHE_SIZE (int): Сколько клавиатур-календарей (месяцев) держать в кэше.
+        CALENDAR_PREFETCH (bool): Строить ли заранее календари соседних месяцев.
+        KEYBOARD_FINGERPRINTS_SIZE (int): Для скольких сообщений помнить последнюю
+            отправленную клавиатуру (0 - не пропускать редактирования; нужно при
+            нескольких процессах, иначе пропуск не учтет изменения из других процессов).
+        KEYBOARD_ROWS_CACHE_SIZE (int): Сколько собранных строк клавиатуры активностей
+            держать в кэше.
+        ACTIVITIES_PAGE_SIZE (int): Сколько активностей показывать на одной странице
+            клавиатуры активностей.
+        OUTBOUND_GLOBAL_RATE (float): Сколько запросов в секунду бот отправляет во все чаты.
+        OUTBOUND_CHAT_RATE (float): Сколько запросов в секунду бот отправляет в один чат.
+        OUTBOUND_CHAT_BURST (float): Сколько запросов в чат можно отправить подряд без ожидания.
+        OUTBOUND_MAX_RETRIES (int): Сколько раз повторять запрос после ответа 429.
+        OUTBOUND_CHAT_BUCKETS (int): Для скольких чатов помнить состояние лимита.
+        DB_PROFILE (str): Профиль движка БД: sqlite, postgresql или auto (по DATABASE_URL).
+        DB_POOL_SIZE (int): Количество постоянных соединений в пуле.
+        DB_MAX_OVERFLOW (int): Сколько соединений можно открыть сверх размера пула.
+        DB_POOL_TIMEOUT (float): Сколько секунд ждать свободного соединения.
+        DB_POOL_RECYCLE (int): Через сколько секунд пересоздавать соединение (-1 - никогда).
+        DB_POOL_PRE_PING (bool): Проверять ли соединение перед выдачей из пула.
+        DB_STATEMENT_CACHE_SIZE (int): Размер кэша подготовленных выражений asyncpg.
+        SQLITE_JOURNAL_MODE (str): Режим журнала SQLite.
+        SQLITE_SYNCHRONOUS (str): Режим синхронизации SQLite с диском.
+        SQLITE_BUSY_TIMEOUT_MS (int): Сколько миллисекунд ждать снятия блокировки SQLite.
+        SQLITE_MMAP_SIZE (int): Размер отображаемой в память части файла SQLite в байтах.
+        SQLITE_SINGLE_WRITER (bool): Писать ли в SQLite через одно соединение-писатель,
+            а читать через пул соединений только для чтения.
+        SQLITE_WRITER_BATCH_SIZE (int): Сколько операций писатель объединяет в транзакцию.
+        SQLITE_WRITER_QUEUE_SIZE (int): Длина очереди писателя (при заполнении запись ждет).
+        DB_QUERY_STATS (bool): Собирать ли время запросов и их количество на обновление.
+        DB_SLOW_QUERY_MS (float): Запросы дольше этого времени (мс) пишутся в журнал.
+        WRITE_BEHIND_ENABLED (bool): Копить ли отметки и введенные вручную минуты в памяти
+            и писать их в БД пачками (таймеры пишутся сразу).
+        WRITE_BEHIND_FLUSH_MS (int): Период записи накопленных нажатий в миллисекундах.
+        WRITE_BEHIND_BATCH_SIZE (int): Сколько логов писать одной транзакцией (при
+            заполнении пачки запись начинается досрочно).
+        IMPORT_CHUNK_SIZE (int): Сколько логов записывать одной транзакцией при импорте.
+        IMPORT_MAX_FILE_BYTES (int): Максимальный размер одного .md файла в архиве импорта.
+        IMPORT_MAX_UPLOAD_BYTES (int): Максимальный размер присланного файла импорта.
     """
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -21,5 +95,75 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     SERVER_URL: str
 
+    ACTIVITY_CACHE_SIZE: int = 1024
+    ACTIVITY_CACHE_TTL: float = 300.0
+
+    FSM_STORAGE: Literal["memory", "sqlite", "redis"] = "sqlite"
+    FSM_SQLITE_PATH: str = "fsm.db"
+    FSM_REDIS_URL: str = "redis://localhost:6379/0"
+    FSM_FLUSH_INTERVAL_MS: int = 100
+    FSM_FLUSH_BATCH_SIZE: int = 100
+    FSM_CACHE_TTL: float = 5.0
+    FSM_CACHE_SIZE: int = 10000
+
+    EXPORT_ZIP_MIN_DAYS: int = 2
+    EXPORT_SPOOL_MAX_BYTES: int = 5 * 1024 * 1024
+
+    JOB_WORKERS: int = 4
+    JOB_PER_USER_LIMIT: int = 1
+    JOB_QUEUE_SIZE: int = 100
+    JOB_SHUTDOWN_TIMEOUT: float = 30.0
+
+    WEBHOOK_MODE: Literal["inline", "queue"] = "queue"
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_QUEUE_SIZE: int = 100
+    WEBHOOK_DRAIN_TIMEOUT: float = 10.0
+    WEBHOOK_SECRET: str | None = None
+    WEBHOOK_JSON_BACKEND: Literal["pydantic", "orjson"] = "pydantic"
+
+    DEDUP_WINDOW: int = 4096
+    DEDUP_STATE_PATH: str | None = None
+
+    STATS_CACHE_SIZE: int = 4096
+    STATS_CACHE_TTL: float = 30.0
+
+    CALENDAR_CACHE_SIZE: int = 64
+    CALENDAR_PREFETCH: bool = True
+
+    KEYBOARD_FINGERPRINTS_SIZE: int = 10000
+    KEYBOARD_ROWS_CACHE_SIZE: int = 4096
+    ACTIVITIES_PAGE_SIZE: int = 10
+
+    OUTBOUND_GLOBAL_RATE: float = 30.0
+    OUTBOUND_CHAT_RATE: float = 1.0
+    OUTBOUND_CHAT_BURST: float = 3.0
+    OUTBOUND_MAX_RETRIES: int = 3
+    OUTBOUND_CHAT_BUCKETS: int = 10000
+
+    DB_PROFILE: Literal["auto", "sqlite", "postgresql"] = "auto"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    SQLITE_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "MEMORY"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL"] = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_SINGLE_WRITER: bool = False
+    SQLITE_WRITER_BATCH_SIZE: int = 64
+    SQLITE_WRITER_QUEUE_SIZE: int = 1000
+    DB_QUERY_STATS: bool = True
+    DB_SLOW_QUERY_MS: float = 200.0
+
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_FLUSH_MS: int = 500
+    WRITE_BEHIND_BATCH_SIZE: int = 100
+
+    IMPORT_CHUNK_SIZE: int = 500
+    IMPORT_MAX_FILE_BYTES: int = 1024 * 1024
+    IMPORT_MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+
 
 settings = Settings()
@@ -0,0 +1,117 @@
+"""Модуль с кэшем активностей пользователей и версиями данных."""
+
+import itertools
+
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.cache import LRUCache
+from core.config import settings
+from db.models import Activity
+
+
+@dataclass(slots=True)
+class UserActivities:
+    """Закэшированные активности пользователя: список и словарь по ID."""
+    activities: list[Activity]
+    by_id: dict[int, Activity]
+
+
+class ActivityCache:
+    """
+    Кэш списков активностей пользователей в памяти процесса.
+
+    Активности меняются только при добавлении новой, поэтому запись
+    сбрасывается после фиксации транзакции `crud.create_activity`, а TTL ограничивает
+    рассинхронизацию между процессами.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id: int) -> UserActivities | None:
+        """Возвращает активности пользователя из кэша или None."""
+        return self._cache.get(user_id)
+
+    def set(self, user_id: int, activities: list[Activity]) -> UserActivities:
+        """Кладет в кэш список активностей пользователя."""
+        entry = UserActivities(
+            activities=activities,
+            by_id={activity.id: activity for activity in activities},
+        )
+        self._cache.set(user_id, entry)
+        return entry
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбрасывает запись пользователя."""
+        self._cache.pop(user_id)
+
+    def stats(self) -> dict[str, int | float]:
+        """Возвращает счетчики попаданий и промахов."""
+        return self._cache.stats()
+
+
+class DataVersions:
+    """
+    Счетчики версий данных пользователей в памяти процесса.
+
+    Каждая запись лога увеличивает версию пользователя, поэтому кэши,
+    в ключ которых входит версия, устаревают без явной инвалидации.
+    Версии берутся из общего возрастающего счетчика и не вытесняются,
+    иначе после вытеснения версия могла бы совпасть со старой.
+
+    Версия увеличивается только в процессе, который записал изменение:
+    записи других процессов она не видит, а значения разных процессов
+    не сравнимы. Поэтому кэши по версии тоже должны быть локальными
+    для процесса, а рассинхронизацию между процессами ограничивает их TTL.
+    """
+
+    def __init__(self):
+        self._versions: dict[int, int] = {}
+        self._counter = itertools.count(1)
+
+    def get(self, user_id: int) -> int:
+        """Возвращает текущую версию данных пользователя."""
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int) -> int:
+        """Увеличивает версию данных пользователя."""
+        version = next(self._counter)
+        self._versions[user_id] = version
+        return version
+
+
+activity_cache = ActivityCache(
+    maxsize=settings.ACTIVITY_CACHE_SIZE,
+    ttl=settings.ACTIVITY_CACHE_TTL,
+)
+data_versions = DataVersions()
+
+
+def invalidate_activities_on_commit(db: AsyncSession, user_id: int) -> None:
+    """Сбросит кэш активностей пользователя после фиксации транзакции сессии."""
+    db.info.setdefault("stale_activities", set()).add(user_id)
+
+
+def bump_version_on_commit(db: AsyncSession, user_id: int) -> None:
+    """Увеличит версию данных пользователя после фиксации транзакции сессии."""
+    db.info.setdefault("changed_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    # До фиксации другие сессии видят старые данные: если сбросить кэши раньше,
+    # параллельное чтение успело бы положить в них устаревший результат
+    for user_id in session.info.pop("stale_activities", ()):
+        activity_cache.invalidate(user_id)
+    for user_id in session.info.pop("changed_users", ()):
+        data_versions.bump(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop("stale_activities", None)
+    session.info.pop("changed_users", None)
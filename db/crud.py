@@ -1,12 +1,41 @@
-"""Модуль с CRUD-операциями для работы с базой данных."""
+"""
+Модуль с CRUD-операциями для работы с базой данных.
+
+Функции записи не фиксируют транзакцию: это делает владелец сессии
+(middleware сессии на обновление, фоновая задача или CLI). В режиме
+`SQLITE_SINGLE_WRITER` они выполняются писателем `db.sqlite_writer`
+и возвращаются уже после фиксации.
+Кэши сбрасываются только после фиксации (см. `db.cache`).
+"""
 import datetime
-from sqlalchemy import func, case
+from typing import AsyncIterator
+from sqlalchemy import and_, delete, func, case, literal, not_, or_, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from db.models import Activity, ActivityType, ActivityLog
+from db.cache import (
+    UserActivities,
+    activity_cache,
+    bump_version_on_commit,
+    invalidate_activities_on_commit,
+)
+from db.instrumentation import instrumented
+from db.models import (
+    Activity,
+    ActivityLog,
+    ActivityRollup,
+    ActivityType,
+    RollupPeriod,
+    RunningTimer,
+)
+from db.read_models import ActivitiesPage, ActivityRow
+from db.rollups import rollup_keys, split_period
+from db.sqlite_writer import writes
 
 
+@instrumented
+@writes
 async def create_activity(
     db: AsyncSession, user_id: int, name: str, type: ActivityType
 ) -> Activity:
@@ -24,11 +53,12 @@ async def create_activity(
     """
     new_activity = Activity(user_id=user_id, name=name, type=type)
     db.add(new_activity)
-    await db.commit()
-    await db.refresh(new_activity)
+    await db.flush()
+    invalidate_activities_on_commit(db, user_id)
     return new_activity
 
 
+@instrumented
 async def get_activity_by_name(
     db: AsyncSession, user_id: int, name: str
 ) -> Activity | None:
@@ -49,9 +79,22 @@ async def get_activity_by_name(
     return result.scalars().first()
 
 
+async def _get_cached_activities(db: AsyncSession, user_id: int) -> UserActivities:
+    """Возвращает активности пользователя из кэша, при промахе загружает их из БД."""
+    cached = activity_cache.get(user_id)
+    if cached is None:
+        result = await db.execute(
+            select(Activity).where(Activity.user_id == user_id).order_by(Activity.id)
+        )
+        cached = activity_cache.set(user_id, list(result.scalars().all()))
+    return cached
+
+
+@instrumented
 async def get_user_activities(db: AsyncSession, user_id: int) -> list[Activity]:
     """
     Получает все активности пользователя.
+    Результат кэшируется в памяти процесса (см. `db.cache`).
 
     Args:
         db: Асинхронная сессия базы данных.
@@ -60,110 +103,505 @@ async def get_user_activities(db: AsyncSession, user_id: int) -> list[Activity]:
     Returns:
         Список объектов Activity пользователя.
     """
-    result = await db.execute(
-        select(Activity).where(Activity.user_id == user_id).order_by(Activity.id)
-    )
-    return list(result.scalars().all())
+    cached = await _get_cached_activities(db, user_id)
+    return list(cached.activities)
 
 
+@instrumented
 async def get_activity_by_id(
     db: AsyncSession, user_id: int, activity_id: int
 ) -> Activity | None:
     """
     Получает активность пользователя по ее ID.
     Проверяет, что активность принадлежит пользователю.
+    Использует кэш активностей пользователя.
     """
-    result = await db.execute(
-        select(Activity).where(
-            Activity.id == activity_id, Activity.user_id == user_id
+    cached = await _get_cached_activities(db, user_id)
+    activity = cached.by_id.get(activity_id)
+    if activity is None:
+        # Активность могли создать в другом процессе после заполнения кэша
+        activity_cache.invalidate(user_id)
+        cached = await _get_cached_activities(db, user_id)
+        activity = cached.by_id.get(activity_id)
+    return activity
+
+
+def _insert_for(db: AsyncSession):
+    """Возвращает конструкцию INSERT с поддержкой ON CONFLICT для диалекта сессии."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+async def _upsert_log(
+    db: AsyncSession,
+    user_id: int,
+    activity_id: int,
+    log_date: datetime.date,
+    value_bool: bool | None,
+    value_minutes: int | None,
+    on_conflict_set: dict,
+) -> tuple[bool | None, int | None] | None:
+    """
+    Атомарно вставляет или обновляет лог активности одним запросом.
+
+    Строка для вставки выбирается из `activities` с проверкой владельца,
+    поэтому для чужой или несуществующей активности ничего не пишется.
+    Транзакцию фиксирует вызывающая функция.
+
+    Returns:
+        Кортеж (value_bool, value_minutes) после записи или None,
+        если активность не найдена или не принадлежит пользователю.
+    """
+    insert = _insert_for(db)
+    source = select(
+        Activity.id,
+        literal(log_date, ActivityLog.date.type),
+        literal(value_bool, ActivityLog.value_bool.type),
+        literal(value_minutes, ActivityLog.value_minutes.type),
+    ).where(Activity.id == activity_id, Activity.user_id == user_id)
+
+    stmt = (
+        insert(ActivityLog)
+        .from_select(
+            ["activity_id", "date", "value_bool", "value_minutes"], source
+        )
+        .on_conflict_do_update(
+            index_elements=[ActivityLog.activity_id, ActivityLog.date],
+            set_=on_conflict_set,
         )
+        .returning(ActivityLog.value_bool, ActivityLog.value_minutes)
     )
-    return result.scalars().first()
+    result = await db.execute(stmt)
+    row = result.first()
+    return tuple(row) if row else None
+
+
+async def _apply_rollup_delta(
+    db: AsyncSession,
+    user_id: int,
+    activity_id: int,
+    log_date: datetime.date,
+    minutes_delta: int = 0,
+    checks_delta: int = 0,
+) -> None:
+    """
+    Прибавляет изменение лога к недельному и месячному итогам активности
+    одним запросом. Версия данных пользователя увеличится после фиксации.
+    Транзакцию фиксирует вызывающая функция.
+    """
+    bump_version_on_commit(db, user_id)
+    insert = _insert_for(db)
+    stmt = insert(ActivityRollup).values([
+        {
+            "user_id": user_id,
+            "activity_id": activity_id,
+            "period": period,
+            "period_start": period_start,
+            "total_minutes": minutes_delta,
+            "total_checks": checks_delta,
+        }
+        for period, period_start in rollup_keys(log_date)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            ActivityRollup.activity_id,
+            ActivityRollup.period,
+            ActivityRollup.period_start,
+        ],
+        set_={
+            "total_minutes": ActivityRollup.total_minutes + stmt.excluded.total_minutes,
+            "total_checks": ActivityRollup.total_checks + stmt.excluded.total_checks,
+        },
+    )
+    await db.execute(stmt)
 
 
-async def get_or_create_log(
+@instrumented
+@writes
+async def toggle_checkbox_log(
     db: AsyncSession, user_id: int, activity_id: int, log_date: datetime.date
-) -> ActivityLog:
+) -> bool | None:
+    """
+    Переключает отметку checkbox-активности на дату одним запросом.
+    Если лога еще нет, он создается сразу отмеченным.
+
+    Returns:
+        Новое значение отметки или None, если активность не найдена.
+    """
+    row = await _upsert_log(
+        db, user_id, activity_id, log_date,
+        value_bool=True,
+        value_minutes=None,
+        on_conflict_set={
+            "value_bool": not_(func.coalesce(ActivityLog.value_bool, False)),
+        },
+    )
+    if row is None:
+        return None
+    await _apply_rollup_delta(
+        db, user_id, activity_id, log_date, checks_delta=1 if row[0] else -1
+    )
+    return row[0]
+
+
+@instrumented
+@writes
+async def add_minutes_to_log(
+    db: AsyncSession,
+    user_id: int,
+    activity_id: int,
+    log_date: datetime.date,
+    minutes: int,
+) -> int | None:
+    """
+    Прибавляет минуты к логу time-активности на дату одним запросом.
+
+    Returns:
+        Итоговое количество минут или None, если активность не найдена.
+    """
+    row = await _upsert_log(
+        db, user_id, activity_id, log_date,
+        value_bool=None,
+        value_minutes=minutes,
+        on_conflict_set={
+            "value_minutes": func.coalesce(ActivityLog.value_minutes, 0) + minutes,
+        },
+    )
+    if row is None:
+        return None
+    await _apply_rollup_delta(db, user_id, activity_id, log_date, minutes_delta=minutes)
+    return row[1]
+
+
+@instrumented
+@writes
+async def set_log_minutes(
+    db: AsyncSession,
+    user_id: int,
+    activity_id: int,
+    log_date: datetime.date,
+    minutes: int,
+) -> int | None:
+    """
+    Перезаписывает количество минут в логе time-активности.
+
+    Сначала лог создается пустым или блокируется, если уже есть, и отдает
+    прежнее значение: параллельная запись того же лога ждет фиксации,
+    поэтому итоги поправляются на верную разницу.
+
+    Returns:
+        Записанное количество минут или None, если активность не найдена.
+    """
+    # ON CONFLICT DO UPDATE блокирует строку до конца транзакции
+    row = await _upsert_log(
+        db, user_id, activity_id, log_date,
+        value_bool=None,
+        value_minutes=None,
+        on_conflict_set={"value_minutes": ActivityLog.value_minutes},
+    )
+    if row is None:
+        return None
+    previous_minutes = row[1]
+    await db.execute(
+        update(ActivityLog)
+        .where(ActivityLog.activity_id == activity_id, ActivityLog.date == log_date)
+        .values(value_minutes=minutes)
+    )
+    await _apply_rollup_delta(
+        db, user_id, activity_id, log_date,
+        minutes_delta=minutes - (previous_minutes or 0),
+    )
+    return minutes
+
+
+@instrumented
+@writes
+async def apply_log_changes(
+    db: AsyncSession,
+    changes: list[tuple[int, int, datetime.date, bool, int | None]],
+) -> None:
+    """
+    Применяет пачку накопленных изменений логов (см. `db.write_behind`).
+    Пачка - одна операция записи: в режиме `SQLITE_SINGLE_WRITER` она целиком
+    выполняется писателем и фиксируется или откатывается вместе.
+
+    Args:
+        db: Асинхронная сессия базы данных.
+        changes: Кортежи (user_id, activity_id, date, переключить ли отметку,
+            записанные минуты или None).
+    """
+    for user_id, activity_id, log_date, toggle, minutes_set in changes:
+        if toggle:
+            await toggle_checkbox_log(db, user_id, activity_id, log_date)
+        if minutes_set is not None:
+            await set_log_minutes(db, user_id, activity_id, log_date, minutes_set)
+
+
+@instrumented
+@writes
+async def bulk_upsert_logs(
+    db: AsyncSession,
+    rows: list[tuple[int, datetime.date, bool | None, int | None]],
+) -> int:
     """
-    Получает или создает лог для активности на указанную дату.
-    Для Checkbox инициализирует False, для Time - 0.
+    Записывает пачку логов одним многострочным INSERT ... ON CONFLICT.
+    Существующие логи на ту же дату перезаписываются.
+
+    Повторы одного лога в пачке сводятся к последнему значению: PostgreSQL
+    не дает одному INSERT ... ON CONFLICT изменить строку дважды.
+
+    Итоги (`activity_rollups`) не обновляются: после массовой записи их нужно
+    пересчитать через `db.rollups.rebuild_rollups`. Принадлежность активностей
+    пользователю проверяет вызывающая функция, транзакцию фиксирует она же.
+
+    Args:
+        db: Асинхронная сессия базы данных.
+        rows: Кортежи (activity_id, date, value_bool, value_minutes).
+
+    Returns:
+        Количество записанных логов (без повторов).
+    """
+    rows = list({(row[0], row[1]): row for row in rows}.values())
+    if not rows:
+        return 0
+    insert = _insert_for(db)
+    stmt = insert(ActivityLog).values([
+        {
+            "activity_id": activity_id,
+            "date": log_date,
+            "value_bool": value_bool,
+            "value_minutes": value_minutes,
+        }
+        for activity_id, log_date, value_bool, value_minutes in rows
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ActivityLog.activity_id, ActivityLog.date],
+        set_={
+            "value_bool": stmt.excluded.value_bool,
+            "value_minutes": stmt.excluded.value_minutes,
+        },
+    )
+    await db.execute(stmt)
+    return len(rows)
+
+
+def _utcnow() -> datetime.datetime:
+    """Текущее время в UTC без часового пояса (так оно хранится в БД)."""
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+@instrumented
+@writes
+async def start_timer(db: AsyncSession, user_id: int, activity_id: int) -> bool:
+    """
+    Запускает таймер time-активности, если он еще не запущен.
+
+    Returns:
+        True, если таймер запущен этим вызовом.
+    """
+    insert = _insert_for(db)
+    source = select(
+        Activity.user_id,
+        Activity.id,
+        literal(_utcnow(), RunningTimer.started_at.type),
+    ).where(Activity.id == activity_id, Activity.user_id == user_id)
+    stmt = (
+        insert(RunningTimer)
+        .from_select(["user_id", "activity_id", "started_at"], source)
+        .on_conflict_do_nothing(index_elements=[RunningTimer.activity_id])
+        .returning(RunningTimer.id)
+    )
+    result = await db.execute(stmt)
+    return result.first() is not None
+
+
+@instrumented
+@writes
+async def stop_timer(
+    db: AsyncSession, user_id: int, activity_id: int, log_date: datetime.date
+) -> int | None:
     """
-    # Сначала убедимся, что активность принадлежит пользователю
-    activity = await get_activity_by_id(db, user_id, activity_id)
-    if not activity:
-        raise ValueError("Activity not found or does not belong to the user")
+    Останавливает таймер и прибавляет прошедшие минуты к логу за дату
+    в одной транзакции (транзакцию фиксирует вызывающая функция). Таймер удаляется
+    через DELETE ... RETURNING, поэтому при двойном нажатии минуты засчитываются один раз.
 
+    Returns:
+        Итоговое количество минут в логе или None, если таймер не был запущен.
+    """
     result = await db.execute(
-        select(ActivityLog).where(
-            ActivityLog.activity_id == activity_id, ActivityLog.date == log_date
+        delete(RunningTimer)
+        .where(
+            RunningTimer.activity_id == activity_id,
+            RunningTimer.user_id == user_id,
+        )
+        .returning(RunningTimer.started_at)
+    )
+    started_at = result.scalar()
+    if started_at is None:
+        return None
+
+    duration_minutes = round((_utcnow() - started_at).total_seconds() / 60)
+    return await add_minutes_to_log(db, user_id, activity_id, log_date, duration_minutes)
+
+
+def _activities_screen_query(user_id: int, log_date: datetime.date):
+    """Запрос строк экрана активностей: активность, лог за день и таймер (LEFT JOIN)."""
+    return (
+        select(
+            Activity.id,
+            Activity.name,
+            Activity.type,
+            ActivityLog.value_bool,
+            ActivityLog.value_minutes,
+            RunningTimer.started_at,
         )
+        .outerjoin(
+            ActivityLog,
+            and_(ActivityLog.activity_id == Activity.id, ActivityLog.date == log_date),
+        )
+        .outerjoin(RunningTimer, RunningTimer.activity_id == Activity.id)
+        .where(Activity.user_id == user_id)
     )
-    log = result.scalars().first()
 
-    if not log:
-        log = ActivityLog(activity_id=activity_id, date=log_date)
-        if activity.type == ActivityType.CHECKBOX:
-            log.value_bool = False
-        elif activity.type == ActivityType.TIME:
-            log.value_minutes = 0
 
-        db.add(log)
-        await db.commit()
-        await db.refresh(log)
+@instrumented
+async def get_activities_page(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    log_date: datetime.date | None = None,
+    after: int = 0,
+    before: int | None = None,
+) -> ActivitiesPage:
+    """
+    Загружает одну страницу экрана активностей с логами за день и таймерами.
+    Страница выбирается по ключу `Activity.id` (keyset), а не через OFFSET:
+    запрос читает только `limit + 1` строк, лишняя строка показывает,
+    есть ли активности за границей страницы.
 
-    return log
+    Args:
+        db: Асинхронная сессия базы данных.
+        user_id: ID пользователя Telegram.
+        limit: Размер страницы.
+        log_date: Дата логов (по умолчанию сегодня).
+        after: Страница из активностей с id больше `after` (0 - первая страница).
+        before: Если задан, страница из последних активностей с id меньше `before`
+            (переход назад); `after` при этом не используется.
+    """
+    log_date = log_date or datetime.date.today()
+    query = _activities_screen_query(user_id, log_date)
 
+    if before is None:
+        result = await db.execute(
+            query.where(Activity.id > after).order_by(Activity.id).limit(limit + 1)
+        )
+        rows = [ActivityRow(*row) for row in result]
+        return ActivitiesPage(rows=rows[:limit], after=after, has_next=len(rows) > limit)
 
-async def get_today_logs_for_user_activities(
-    db: AsyncSession, user_id: int
-) -> dict[int, ActivityLog]:
-    """Получает все логи пользователя за сегодня в виде словаря {activity_id: log}."""
-    today = datetime.date.today()
     result = await db.execute(
-        select(ActivityLog)
-        .join(Activity, Activity.id == ActivityLog.activity_id)
-        .where(Activity.user_id == user_id, ActivityLog.date == today)
+        query.where(Activity.id < before).order_by(Activity.id.desc()).limit(limit + 1)
     )
-    logs_list = result.scalars().all()
-    return {log.activity_id: log for log in logs_list}
+    rows = [ActivityRow(*row) for row in result]
+    # Лишняя строка - последняя активность предыдущей страницы, она и есть курсор
+    page_after = rows[limit].id if len(rows) > limit else 0
+    return ActivitiesPage(rows=rows[:limit][::-1], after=page_after, has_next=True)
 
 
-async def get_user_logs_for_period(
-    db: AsyncSession, user_id: int, start_date: datetime.date, end_date: datetime.date
-) -> list[ActivityLog]:
-    """Получает все логи пользователя за указанный период."""
-    result = await db.execute(
-        select(ActivityLog)
+@instrumented
+async def stream_user_logs_for_period(
+    db: AsyncSession,
+    user_id: int,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    batch_size: int = 500,
+) -> AsyncIterator[tuple[datetime.date, int, bool | None, int | None]]:
+    """
+    Потоково отдает логи пользователя за период в порядке дат, не загружая
+    всю выборку в память.
+
+    Yields:
+        Кортежи (date, activity_id, value_bool, value_minutes).
+    """
+    result = await db.stream(
+        select(
+            ActivityLog.date,
+            ActivityLog.activity_id,
+            ActivityLog.value_bool,
+            ActivityLog.value_minutes,
+        )
         .join(Activity, Activity.id == ActivityLog.activity_id)
         .where(Activity.user_id == user_id, ActivityLog.date.between(start_date, end_date))
         .order_by(ActivityLog.date)
+        .execution_options(yield_per=batch_size)
     )
-    return list(result.scalars().all())
+    async for row in result:
+        yield row
 
 
+@instrumented
 async def get_user_stats_for_period(
     db: AsyncSession, user_id: int, start_date: datetime.date, end_date: datetime.date
 ) -> list[tuple[str, ActivityType, int | None, int | None]]:
     """
     Собирает статистику по активностям пользователя за указанный период.
 
+    Полные месяцы и недели периода берутся из предрасчитанных итогов
+    (`activity_rollups`), и только неполные края считаются по сырым логам.
+
     Возвращает список кортежей:
     (activity_name, activity_type, total_minutes, total_checks)
     """
+    months, weeks, raw_ranges = split_period(start_date, end_date)
+
+    parts = []
+    rollup_periods = []
+    if months:
+        rollup_periods.append(
+            and_(
+                ActivityRollup.period == RollupPeriod.MONTH,
+                ActivityRollup.period_start.in_(months),
+            )
+        )
+    if weeks:
+        rollup_periods.append(
+            and_(
+                ActivityRollup.period == RollupPeriod.WEEK,
+                ActivityRollup.period_start.in_(weeks),
+            )
+        )
+    if rollup_periods:
+        parts.append(
+            select(
+                ActivityRollup.activity_id.label("activity_id"),
+                ActivityRollup.total_minutes.label("minutes"),
+                ActivityRollup.total_checks.label("checks"),
+            ).where(ActivityRollup.user_id == user_id, or_(*rollup_periods))
+        )
+    if raw_ranges:
+        parts.append(
+            select(
+                ActivityLog.activity_id.label("activity_id"),
+                ActivityLog.value_minutes.label("minutes"),
+                case((ActivityLog.value_bool, 1), else_=0).label("checks"),
+            )
+            .join(Activity, Activity.id == ActivityLog.activity_id)
+            .where(
+                Activity.user_id == user_id,
+                or_(*(ActivityLog.date.between(start, end) for start, end in raw_ranges)),
+            )
+        )
+
+    totals = (parts[0] if len(parts) == 1 else union_all(*parts)).subquery()
     query = (
         select(
             Activity.name,
             Activity.type,
-            func.sum(ActivityLog.value_minutes).label("total_minutes"),
-            func.sum(case((ActivityLog.value_bool, 1), else_=0)).label(
-                "total_checks"
-            ),
-        )
-        .join(ActivityLog, Activity.id == ActivityLog.activity_id)
-        .where(
-            Activity.user_id == user_id,
-            ActivityLog.date.between(start_date, end_date),
+            func.sum(totals.c.minutes).label("total_minutes"),
+            func.sum(totals.c.checks).label("total_checks"),
         )
+        .join(totals, Activity.id == totals.c.activity_id)
+        .where(Activity.user_id == user_id)
         .group_by(Activity.id, Activity.name, Activity.type)
         .order_by(Activity.id)
     )
@@ -1,20 +1,94 @@
 """Модуль для настройки подключения к базе данных."""
 
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 
-from core.config import settings
+from core.config import Settings, settings
+from db import instrumentation
+from db.pool import TimedQueuePool
+
+
+def get_engine_profile(config: Settings) -> str:
+    """Возвращает профиль движка: из настроек или по диалекту DATABASE_URL."""
+    if config.DB_PROFILE != "auto":
+        return config.DB_PROFILE
+    backend = make_url(config.DATABASE_URL).get_backend_name()
+    return "postgresql" if backend == "postgresql" else "sqlite"
+
+
+def get_engine_options(config: Settings) -> dict[str, Any]:
+    """Собирает параметры create_async_engine для выбранного профиля."""
+    options: dict[str, Any] = {"pool_pre_ping": config.DB_POOL_PRE_PING}
+    url = make_url(config.DATABASE_URL)
+
+    if get_engine_profile(config) == "postgresql":
+        options["connect_args"] = {
+            # Кэш подготовленных выражений asyncpg на каждое соединение
+            "prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+        }
+    elif url.database in (None, "", ":memory:"):
+        # База в памяти живет в одном соединении, пул по умолчанию (StaticPool) не меняем
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def single_writer_enabled(config: Settings) -> bool:
+    """Включен ли режим одного писателя (только для SQLite в файле)."""
+    return (
+        config.SQLITE_SINGLE_WRITER
+        and get_engine_profile(config) == "sqlite"
+        and make_url(config.DATABASE_URL).database not in (None, "", ":memory:")
+    )
+
+
+def apply_sqlite_pragmas(dbapi_connection, query_only: bool = False) -> None:
+    """Применяет PRAGMA профиля SQLite к соединению."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    if query_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Применяет PRAGMA к каждому новому соединению. В режиме одного писателя
+    соединения основного движка только читают: пишет `db.sqlite_writer`.
+    """
+    apply_sqlite_pragmas(dbapi_connection, query_only=single_writer_enabled(settings))
+
 
 # Создаем асинхронный "движок" для взаимодействия с БД.
 # echo=True полезно для отладки, т.к. выводит все SQL-запросы в консоль.
 async_engine = create_async_engine(
     url=settings.DATABASE_URL,
     echo=False,  # В реальном приложении лучше поставить False
+    **get_engine_options(settings),
 )
 
+if get_engine_profile(settings) == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+if settings.DB_QUERY_STATS:
+    instrumentation.install(async_engine.sync_engine)
+
 # Создаем фабрику сессий, которая будет создавать новые сессии для каждого запроса.
 async_session_factory = async_sessionmaker(
     bind=async_engine,
@@ -23,10 +97,9 @@ async_session_factory = async_sessionmaker(
 )
 
 
-async def get_async_session() -> AsyncSession:
-    """
-    Асинхронный генератор для получения сессии базы данных.
-    Обеспечивает корректное открытие и закрытие сессии.
-    """
-    async with async_session_factory() as session:
-        yield session
+def pool_stats() -> dict[str, int | float | str]:
+    """Возвращает состояние пула соединений движка."""
+    pool = async_engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return {"profile": get_engine_profile(settings), **pool.stats()}
+    return {"profile": get_engine_profile(settings), "status": pool.status()}
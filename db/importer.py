@@ -0,0 +1,223 @@
+"""
+Модуль с импортом логов активностей из Markdown-файлов экспорта.
+
+Принимает файлы `ГГГГ-ММ-ДД.md` с front-matter `название: значение`
+(по одному или в ZIP-архиве, как их отдает экспорт бота). Файлы читаются
+по одному, логи пишутся многострочными upsert-ами пачками в отдельных
+транзакциях, после чего итоги пользователя пересчитываются.
+
+    python -m db.importer --user-id ID FILE [FILE ...]
+"""
+
+import argparse
+import asyncio
+import datetime
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, BinaryIO, Callable, Iterable, Iterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db import crud
+from db.models import Activity, ActivityType
+from db.rollups import rebuild_rollups
+
+DayValues = tuple[datetime.date, dict[str, str]]
+
+TRUE_VALUES = {"true", "1", "yes", "да"}
+FALSE_VALUES = {"false", "0", "no", "нет"}
+
+
+@dataclass(slots=True)
+class ImportResult:
+    """Итоги импорта."""
+    days: int = 0
+    logs: int = 0
+    invalid_values: int = 0
+    skipped_files: list[str] = field(default_factory=list)
+    unknown_activities: set[str] = field(default_factory=set)
+
+
+def parse_front_matter(text: str) -> dict[str, str]:
+    """Разбирает front-matter `название: значение` между строками `---`."""
+    values: dict[str, str] = {}
+    lines = iter(text.splitlines())
+    if next(lines, "").strip() != "---":
+        return values
+    for line in lines:
+        if line.strip() == "---":
+            break
+        # Значение не содержит двоеточий, а название может
+        name, separator, value = line.rpartition(":")
+        if separator and name.strip():
+            values[name.strip()] = value.strip()
+    return values
+
+
+def parse_day_file(filename: str, content: bytes) -> DayValues | None:
+    """Возвращает дату из имени файла и значения из front-matter или None."""
+    path = Path(filename)
+    if path.suffix.lower() != ".md":
+        return None
+    try:
+        day = datetime.date.fromisoformat(path.stem)
+    except ValueError:
+        return None
+    return day, parse_front_matter(content.decode("utf-8-sig", errors="replace"))
+
+
+def iter_zip_days(file: BinaryIO, result: ImportResult) -> Iterator[DayValues]:
+    """Потоково отдает дни из ZIP-архива, распаковывая по одному файлу."""
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > settings.IMPORT_MAX_FILE_BYTES:
+                result.skipped_files.append(info.filename)
+                continue
+            with archive.open(info) as member:
+                day = parse_day_file(info.filename, member.read())
+            if day is None:
+                result.skipped_files.append(info.filename)
+                continue
+            yield day
+
+
+def iter_path_days(paths: Iterable[Path], result: ImportResult) -> Iterator[DayValues]:
+    """Отдает дни из файлов на диске: отдельных .md и ZIP-архивов."""
+    for path in paths:
+        if path.suffix.lower() == ".zip":
+            with path.open("rb") as file:
+                yield from iter_zip_days(file, result)
+            continue
+        day = parse_day_file(path.name, path.read_bytes())
+        if day is None:
+            result.skipped_files.append(str(path))
+            continue
+        yield day
+
+
+def _parse_value(
+    type: ActivityType, value: str
+) -> tuple[bool | None, int | None] | None:
+    """Переводит значение из файла в (value_bool, value_minutes) или None при ошибке."""
+    value = value.lower()
+    if type == ActivityType.CHECKBOX:
+        if value in TRUE_VALUES:
+            return True, None
+        if value in FALSE_VALUES:
+            return False, None
+        return None
+    if value.isdigit():
+        return None, int(value)
+    return None
+
+
+async def import_days(
+    db: AsyncSession,
+    user_id: int,
+    days: Iterable[DayValues],
+    result: ImportResult | None = None,
+    progress: Callable[[str], Awaitable[None]] | None = None,
+) -> ImportResult:
+    """
+    Записывает логи пользователя из разобранных файлов.
+
+    Названия сопоставляются с активностями пользователя один раз. Пустые
+    значения (`false` и `0`) пропускаются: экспорт пишет их и за дни без
+    записей. Логи пишутся пачками по `IMPORT_CHUNK_SIZE`, каждая пачка
+    в своей транзакции, а в конце (в том числе после ошибки) итоги
+    пользователя пересчитываются.
+    """
+    result = result or ImportResult()
+    activities = {
+        activity.name: activity
+        for activity in await crud.get_user_activities(db, user_id=user_id)
+    }
+
+    try:
+        await _import_batches(db, activities, days, result, progress)
+    finally:
+        if result.logs:
+            # Записанные пачки уже зафиксированы: итоги пересчитываются и после
+            # ошибки на середине импорта, иначе статистика разошлась бы с логами
+            await db.rollback()
+            await rebuild_rollups(db, user_id=user_id)
+            await db.commit()
+    return result
+
+
+async def _import_batches(
+    db: AsyncSession,
+    activities: dict[str, Activity],
+    days: Iterable[DayValues],
+    result: ImportResult,
+    progress: Callable[[str], Awaitable[None]] | None,
+) -> None:
+    batch: list[tuple[int, datetime.date, bool | None, int | None]] = []
+    for day, values in days:
+        result.days += 1
+        for name, raw_value in values.items():
+            activity = activities.get(name)
+            if activity is None:
+                result.unknown_activities.add(name)
+                continue
+            value = _parse_value(activity.type, raw_value)
+            if value is None:
+                result.invalid_values += 1
+                continue
+            value_bool, value_minutes = value
+            if not value_bool and not value_minutes:
+                continue
+            batch.append((activity.id, day, value_bool, value_minutes))
+
+        if len(batch) >= settings.IMPORT_CHUNK_SIZE:
+            await _write_batch(db, batch, result)
+            if progress:
+                await progress(f"обработано {result.days} дн., записано {result.logs} логов")
+
+    await _write_batch(db, batch, result)
+
+
+async def _write_batch(
+    db: AsyncSession,
+    batch: list[tuple[int, datetime.date, bool | None, int | None]],
+    result: ImportResult,
+) -> None:
+    if not batch:
+        return
+    written = await crud.bulk_upsert_logs(db, batch)
+    await db.commit()
+    result.logs += written
+    batch.clear()
+
+
+async def _main() -> None:
+    from db.database import async_engine, async_session_factory
+    from db.sqlite_writer import sqlite_writer
+
+    parser = argparse.ArgumentParser(description="Импорт логов из Markdown-файлов экспорта.")
+    parser.add_argument("--user-id", type=int, required=True, help="ID пользователя Telegram.")
+    parser.add_argument("files", nargs="+", type=Path, help="Файлы .md и ZIP-архивы.")
+    args = parser.parse_args()
+
+    result = ImportResult()
+    async with async_session_factory() as db:
+        await import_days(db, args.user_id, iter_path_days(args.files, result), result)
+    if sqlite_writer is not None:
+        await sqlite_writer.stop()
+    await async_engine.dispose()
+
+    print(f"Дней: {result.days}, записано логов: {result.logs}")
+    if result.invalid_values:
+        print(f"Некорректных значений: {result.invalid_values}")
+    if result.unknown_activities:
+        print("Неизвестные активности: " + ", ".join(sorted(result.unknown_activities)))
+    if result.skipped_files:
+        print("Пропущенные файлы: " + ", ".join(result.skipped_files))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
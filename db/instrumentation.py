@@ -0,0 +1,201 @@
+"""
+Модуль с учетом запросов к БД: время каждого запроса, количество запросов
+на обновление и журнал медленных запросов.
+
+Запросы помечаются функцией `crud`, из которой они выполнены (декоратор
+`instrumented`), и обработчиком, который обрабатывает обновление
+(`QueryCounterMiddleware`). Метки передаются через contextvars, поэтому
+доходят до событий SQLAlchemy без изменения сигнатур.
+"""
+
+import bisect
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы времени запросов, мс
+TIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+# Границы корзин гистограммы количества запросов на обновление
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+_operation: ContextVar[str | None] = ContextVar("db_operation", default=None)
+_handler: ContextVar[str | None] = ContextVar("db_handler", default=None)
+_update_counter: ContextVar["UpdateQueries | None"] = ContextVar(
+    "db_update_queries", default=None
+)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин, суммой и максимумом."""
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        """Возвращает счетчики; корзины - накопительные, как в Prometheus (le)."""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip((*self.bounds, "+Inf"), self.buckets):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "buckets": buckets,
+        }
+
+
+@dataclass(slots=True)
+class UpdateQueries:
+    """Запросы, выполненные при обработке одного обновления."""
+    count: int = 0
+
+
+class QueryStats:
+    """Накопленная статистика запросов по операциям и обработчикам."""
+
+    def __init__(self):
+        self.by_operation: dict[str, Histogram] = {}
+        self.per_update: dict[str, Histogram] = {}
+        self.slow_queries = 0
+
+    def record_query(self, operation: str, elapsed_ms: float) -> None:
+        histogram = self.by_operation.get(operation)
+        if histogram is None:
+            histogram = self.by_operation[operation] = Histogram(TIME_BUCKETS_MS)
+        histogram.observe(elapsed_ms)
+
+    def record_update(self, handler: str, queries: UpdateQueries) -> None:
+        histogram = self.per_update.get(handler)
+        if histogram is None:
+            histogram = self.per_update[handler] = Histogram(COUNT_BUCKETS)
+        histogram.observe(queries.count)
+
+    def snapshot(self) -> dict:
+        """Возвращает гистограммы времени запросов (мс) и запросов на обновление."""
+        return {
+            "slow_queries": self.slow_queries,
+            "slow_query_ms": settings.DB_SLOW_QUERY_MS,
+            "query_time_ms": {
+                operation: histogram.snapshot()
+                for operation, histogram in sorted(self.by_operation.items())
+            },
+            "queries_per_update": {
+                handler: histogram.snapshot()
+                for handler, histogram in sorted(self.per_update.items())
+            },
+        }
+
+
+query_stats = QueryStats()
+
+
+def instrumented(func):
+    """Помечает запросы, выполненные внутри функции, ее именем."""
+    name = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def generator_wrapper(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    # Метку ставим только на время шага: между шагами код вызывающего
+                    token = _operation.set(name)
+                    try:
+                        item = await anext(generator)
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _operation.reset(token)
+                    yield item
+            finally:
+                await generator.aclose()
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        # Вложенные вызовы (stop_timer -> add_minutes_to_log) учитываются внешней функцией
+        if _operation.get() is not None:
+            return await func(*args, **kwargs)
+        token = _operation.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+    return wrapper
+
+
+def begin_update(handler: str) -> tuple[UpdateQueries, tuple]:
+    """Начинает учет запросов обновления, которое обрабатывает `handler`."""
+    queries = UpdateQueries()
+    tokens = (_handler.set(handler), _update_counter.set(queries))
+    return queries, tokens
+
+
+def end_update(handler: str, queries: UpdateQueries, tokens: tuple) -> None:
+    """Завершает учет запросов обновления и записывает их количество."""
+    handler_token, counter_token = tokens
+    _update_counter.reset(counter_token)
+    _handler.reset(handler_token)
+    query_stats.record_update(handler, queries)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_started_at"].pop()) * 1000
+    operation = _operation.get() or "other"
+    query_stats.record_query(operation, elapsed_ms)
+
+    queries = _update_counter.get()
+    if queries is not None:
+        queries.count += 1
+
+    if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+        query_stats.slow_queries += 1
+        logger.warning(
+            "Медленный запрос %.1f мс (%s, обработчик %s): %s",
+            elapsed_ms,
+            operation,
+            _handler.get() or "-",
+            " ".join(statement.split())[:500],
+        )
+
+
+def _handle_error(exception_context) -> None:
+    # after_cursor_execute при ошибке не вызывается, убираем отметку времени сами
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started_at"):
+        connection.info["query_started_at"].pop()
+
+
+def install(engine: Engine) -> None:
+    """Подключает учет запросов к движку."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
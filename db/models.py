@@ -1,13 +1,15 @@
 """Модуль с моделями базы данных SQLAlchemy."""
 
 import enum
-from datetime import date
+from datetime import date, datetime
 
 from sqlalchemy import (
     Boolean,
     Date,
+    DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
@@ -26,6 +28,12 @@ class ActivityType(enum.Enum):
     TIME = "time"
 
 
+class RollupPeriod(enum.Enum):
+    """Перечисление периодов предрасчитанных итогов."""
+    WEEK = "week"
+    MONTH = "month"
+
+
 class Activity(Base):
     """Модель для хранения активностей."""
     __tablename__ = "activities"
@@ -58,6 +66,18 @@ class Activity(Base):
 class ActivityLog(Base):
     """Модель для хранения логов (записей) по активностям."""
     __tablename__ = "activity_logs"
+    __table_args__ = (
+        # Один лог на активность в день; индекс обслуживает поиск лога за дату.
+        Index("ux_activity_logs_activity_date", "activity_id", "date", unique=True),
+        # Покрывающий индекс для выборок и агрегатов за период без чтения таблицы.
+        Index(
+            "ix_activity_logs_activity_date_values",
+            "activity_id",
+            "date",
+            "value_bool",
+            "value_minutes",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer,
@@ -81,3 +101,74 @@ class ActivityLog(Base):
     def __repr__(self) -> str:
         return f"<ActivityLog(id={self.id}, activity_id={self.activity_id}, date='{self.date}')>"
 
+
+class RunningTimer(Base):
+    """Модель для хранения запущенных таймеров time-активностей."""
+    __tablename__ = "running_timers"
+
+    id: Mapped[int] = mapped_column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    activity_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("activities.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+    # Время запуска в UTC без часового пояса
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<RunningTimer(activity_id={self.activity_id}, "
+            f"started_at='{self.started_at}')>"
+        )
+
+
+class ActivityRollup(Base):
+    """
+    Модель для хранения предрасчитанных итогов активности за неделю или месяц.
+    Обновляется инкрементально при каждой записи лога.
+    """
+    __tablename__ = "activity_rollups"
+    __table_args__ = (
+        Index(
+            "ux_activity_rollups_activity_period",
+            "activity_id",
+            "period",
+            "period_start",
+            unique=True,
+        ),
+        Index(
+            "ix_activity_rollups_user_period",
+            "user_id",
+            "period",
+            "period_start",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    activity_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("activities.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    period: Mapped[RollupPeriod] = mapped_column(Enum(RollupPeriod), nullable=False)
+    # Понедельник недели или первое число месяца
+    period_start: Mapped[date] = mapped_column(Date, nullable=False)
+    total_minutes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_checks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f"<ActivityRollup(activity_id={self.activity_id}, "
+            f"period='{self.period.value}', period_start='{self.period_start}')>"
+        )
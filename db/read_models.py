@@ -0,0 +1,38 @@
+"""Модуль с легковесными моделями чтения (без накладных расходов ORM)."""
+
+import datetime
+from dataclasses import dataclass
+
+from db.models import ActivityType
+
+
+@dataclass(slots=True, frozen=True)
+class ActivityRow:
+    """Строка экрана активностей: активность, ее значение за день и таймер."""
+    id: int
+    name: str
+    type: ActivityType
+    value_bool: bool | None
+    value_minutes: int | None
+    timer_started_at: datetime.datetime | None
+
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли таймер активности."""
+        return self.timer_started_at is not None
+
+
+@dataclass(slots=True, frozen=True)
+class ActivitiesPage:
+    """
+    Страница экрана активностей. Страницы выбираются по ключу `Activity.id`:
+    на странице активности с id больше `after`.
+    """
+    rows: list[ActivityRow]
+    after: int
+    has_next: bool
+
+    @property
+    def has_prev(self) -> bool:
+        """Есть ли активности до этой страницы."""
+        return self.after > 0
@@ -0,0 +1,155 @@
+"""
+Модуль с предрасчитанными итогами активностей за недели и месяцы.
+
+Итоги обновляются инкрементально при каждой записи лога (см. `db.crud`),
+а при расхождениях их можно пересчитать командой:
+
+    python -m db.rollups rebuild [--user-id ID]
+"""
+
+import argparse
+import asyncio
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import case, delete, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.cache import bump_version_on_commit
+from db.models import Activity, ActivityLog, ActivityRollup, RollupPeriod
+from db.sqlite_writer import writes
+
+
+def week_start(day: datetime.date) -> datetime.date:
+    """Возвращает понедельник недели, в которую входит дата."""
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    """Возвращает первое число месяца, в который входит дата."""
+    return day.replace(day=1)
+
+
+def month_end(day: datetime.date) -> datetime.date:
+    """Возвращает последнее число месяца, в который входит дата."""
+    next_month = (day.replace(day=1) + datetime.timedelta(days=31)).replace(day=1)
+    return next_month - datetime.timedelta(days=1)
+
+
+def split_period(
+    start_date: datetime.date, end_date: datetime.date
+) -> tuple[list[datetime.date], list[datetime.date], list[tuple[datetime.date, datetime.date]]]:
+    """
+    Разбивает период на полные месяцы, полные недели и оставшиеся края.
+
+    Returns:
+        Кортеж (начала полных месяцев, начала полных недель,
+        диапазоны дней, которые нужно считать по сырым логам).
+    """
+    months: list[datetime.date] = []
+    weeks: list[datetime.date] = []
+    raw_ranges: list[tuple[datetime.date, datetime.date]] = []
+
+    day = start_date
+    while day <= end_date:
+        if day.day == 1 and month_end(day) <= end_date:
+            months.append(day)
+            day = month_end(day) + datetime.timedelta(days=1)
+        elif day.weekday() == 0 and day + datetime.timedelta(days=6) <= end_date:
+            weeks.append(day)
+            day += datetime.timedelta(days=7)
+        else:
+            if raw_ranges and raw_ranges[-1][1] == day - datetime.timedelta(days=1):
+                raw_ranges[-1] = (raw_ranges[-1][0], day)
+            else:
+                raw_ranges.append((day, day))
+            day += datetime.timedelta(days=1)
+
+    return months, weeks, raw_ranges
+
+
+def rollup_keys(day: datetime.date) -> list[tuple[RollupPeriod, datetime.date]]:
+    """Возвращает периоды итогов, в которые попадает дата."""
+    return [
+        (RollupPeriod.WEEK, week_start(day)),
+        (RollupPeriod.MONTH, month_start(day)),
+    ]
+
+
+@writes
+async def rebuild_rollups(db: AsyncSession, user_id: int | None = None) -> int:
+    """
+    Пересчитывает итоги по сырым логам (для одного пользователя или для всех).
+    Транзакцию фиксирует вызывающая функция.
+
+    Returns:
+        Количество записанных строк итогов.
+    """
+    totals: defaultdict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+    query = (
+        select(
+            Activity.user_id,
+            ActivityLog.activity_id,
+            ActivityLog.date,
+            func.coalesce(ActivityLog.value_minutes, 0),
+            case((ActivityLog.value_bool, 1), else_=0),
+        )
+        .join(Activity, Activity.id == ActivityLog.activity_id)
+        .execution_options(yield_per=1000)
+    )
+    if user_id is not None:
+        query = query.where(Activity.user_id == user_id)
+
+    result = await db.stream(query)
+    async for owner_id, activity_id, day, minutes, checks in result:
+        for period, period_start in rollup_keys(day):
+            total = totals[(owner_id, activity_id, period, period_start)]
+            total[0] += minutes
+            total[1] += checks
+
+    stmt = delete(ActivityRollup)
+    if user_id is not None:
+        stmt = stmt.where(ActivityRollup.user_id == user_id)
+    await db.execute(stmt)
+
+    rows = [
+        {
+            "user_id": owner_id,
+            "activity_id": activity_id,
+            "period": period,
+            "period_start": period_start,
+            "total_minutes": minutes,
+            "total_checks": checks,
+        }
+        for (owner_id, activity_id, period, period_start), (minutes, checks) in totals.items()
+    ]
+    for offset in range(0, len(rows), 1000):
+        await db.execute(insert(ActivityRollup), rows[offset:offset + 1000])
+    if user_id is not None:
+        # Кэши статистики пользователя устареют после фиксации
+        bump_version_on_commit(db, user_id)
+    return len(rows)
+
+
+async def _main() -> None:
+    from db.database import async_engine, async_session_factory
+    from db.sqlite_writer import sqlite_writer
+
+    parser = argparse.ArgumentParser(description="Пересчет итогов активностей.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Пересчитать итоги по сырым логам.")
+    rebuild.add_argument("--user-id", type=int, default=None, help="Только для пользователя.")
+    args = parser.parse_args()
+
+    async with async_session_factory() as db:
+        count = await rebuild_rollups(db, user_id=args.user_id)
+        await db.commit()
+    if sqlite_writer is not None:
+        await sqlite_writer.stop()
+    await async_engine.dispose()
+    print(f"Записано строк итогов: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
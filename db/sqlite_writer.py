@@ -0,0 +1,242 @@
+"""
+Модуль с единственным писателем SQLite (`SQLITE_SINGLE_WRITER`).
+
+SQLite допускает одну пишущую транзакцию за раз: при нескольких пишущих
+соединениях остальные ждут `busy_timeout` и могут получить
+"database is locked". В этом режиме все записи `crud` (декоратор `writes`)
+ставятся в очередь одного соединения-писателя. Писатель забирает из очереди
+все накопившиеся операции (до `SQLITE_WRITER_BATCH_SIZE`) и выполняет их
+в одной транзакции, каждую в своей точке сохранения: ошибка одной операции
+откатывает только ее. Основной движок (`db.database`) в этом режиме открывает
+соединения с `PRAGMA query_only` и только читает, поэтому чтения в WAL
+не ждут записей.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from core.config import settings
+from db import instrumentation
+from db.database import apply_sqlite_pragmas, single_writer_enabled
+from db.instrumentation import COUNT_BUCKETS, TIME_BUCKETS_MS, Histogram
+from db.update_writes import mark_committed, mark_committed_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Выставлен внутри операции писателя: вложенные записи выполняются сразу в ней
+_in_writer: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "sqlite_writer_operation", default=False
+)
+
+_STOP = object()
+
+
+@dataclass(slots=True)
+class _Operation:
+    """Операция в очереди писателя."""
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    # Контекст вызывающего: метки учета запросов (db.instrumentation) доходят до писателя
+    context: contextvars.Context
+    future: asyncio.Future
+    queued_at: float
+
+
+def _on_connect(dbapi_connection, connection_record) -> None:
+    apply_sqlite_pragmas(dbapi_connection)
+    # pysqlite сам открывает транзакции только перед DML, из-за чего не работают
+    # SAVEPOINT; отключаем это и открываем транзакцию в событии begin
+    dbapi_connection.isolation_level = None
+
+
+def _on_begin(connection) -> None:
+    # IMMEDIATE сразу берет блокировку записи, а не при первом изменении
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class SQLiteWriter:
+    """Соединение-писатель с очередью операций, объединяемых в транзакции."""
+
+    def __init__(self, url: str, batch_size: int, queue_size: int):
+        self.batch_size = batch_size
+        self.engine = create_async_engine(
+            url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+        )
+        event.listen(self.engine.sync_engine, "connect", _on_connect)
+        event.listen(self.engine.sync_engine, "begin", _on_begin)
+        if settings.DB_QUERY_STATS:
+            instrumentation.install(self.engine.sync_engine)
+        self._session_factory = async_sessionmaker(
+            bind=self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._task: asyncio.Task | None = None
+        self.max_queue_depth = 0
+        self.operations = 0
+        self.failed_operations = 0
+        self.transactions = 0
+        self.failed_transactions = 0
+        self.batch_sizes = Histogram(COUNT_BUCKETS)
+        self.queue_wait_ms = Histogram(TIME_BUCKETS_MS)
+        self.transaction_time_ms = Histogram(TIME_BUCKETS_MS)
+
+    async def submit(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Ставит `func(session, *args, **kwargs)` в очередь и ждет фиксации
+        транзакции, в которую попала операция.
+        """
+        await self.start()
+        operation = _Operation(
+            func=func,
+            args=args,
+            kwargs=kwargs,
+            context=contextvars.copy_context(),
+            future=asyncio.get_running_loop().create_future(),
+            queued_at=time.perf_counter(),
+        )
+        await self._queue.put(operation)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await operation.future
+
+    async def start(self) -> None:
+        """Запускает писателя (при первой записи это происходит само)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="sqlite-writer")
+
+    async def stop(self) -> None:
+        """Выполняет уже поставленные операции, останавливает писателя и закрывает соединение."""
+        if self._task is not None:
+            await self._queue.put(_STOP)
+            await self._task
+            self._task = None
+        await self.engine.dispose()
+
+    async def _run(self) -> None:
+        while True:
+            operations = []
+            operation = await self._queue.get()
+            while operation is not _STOP:
+                if not operation.future.cancelled():
+                    operations.append(operation)
+                if len(operations) >= self.batch_size or self._queue.empty():
+                    break
+                operation = self._queue.get_nowait()
+            if operations:
+                await self._execute(operations)
+            if operation is _STOP:
+                return
+
+    async def _execute(self, operations: list[_Operation]) -> None:
+        """Выполняет операции в одной транзакции и передает результаты ожидающим."""
+        started = time.perf_counter()
+        for operation in operations:
+            self.queue_wait_ms.observe((started - operation.queued_at) * 1000)
+
+        outcomes = []
+        try:
+            async with self._session_factory() as session:
+                for operation in operations:
+                    # Своя задача в контексте вызывающего, чтобы запросы учитывались за ним
+                    task = asyncio.create_task(
+                        self._apply(session, operation), context=operation.context
+                    )
+                    outcomes.append(await task)
+                await session.commit()
+        except Exception as error:
+            # Не удалось открыть или зафиксировать транзакцию: не записана ни одна операция
+            logger.exception("Писатель SQLite не смог записать %d операций", len(operations))
+            self.failed_transactions += 1
+            self.failed_operations += len(operations)
+            for operation in operations:
+                if not operation.future.done():
+                    operation.future.set_exception(error)
+            return
+
+        self.transactions += 1
+        self.operations += len(operations)
+        self.batch_sizes.observe(len(operations))
+        self.transaction_time_ms.observe((time.perf_counter() - started) * 1000)
+        for operation, (ok, value) in zip(operations, outcomes):
+            if not ok:
+                self.failed_operations += 1
+            if operation.future.done():
+                continue
+            if ok:
+                operation.future.set_result(value)
+            else:
+                operation.future.set_exception(value)
+
+    @staticmethod
+    async def _apply(session: AsyncSession, operation: _Operation) -> tuple[bool, Any]:
+        _in_writer.set(True)
+        try:
+            async with session.begin_nested():
+                return True, await operation.func(session, *operation.args, **operation.kwargs)
+        except Exception as error:
+            return False, error
+
+    def stats(self) -> dict:
+        """Возвращает длину очереди, счетчики и гистограммы транзакций писателя."""
+        return {
+            "enabled": True,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "operations": self.operations,
+            "failed_operations": self.failed_operations,
+            "transactions": self.transactions,
+            "failed_transactions": self.failed_transactions,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "transaction_time_ms": self.transaction_time_ms.snapshot(),
+        }
+
+
+sqlite_writer = SQLiteWriter(
+    url=settings.DATABASE_URL,
+    batch_size=settings.SQLITE_WRITER_BATCH_SIZE,
+    queue_size=settings.SQLITE_WRITER_QUEUE_SIZE,
+) if single_writer_enabled(settings) else None
+
+
+def writes(func):
+    """
+    Направляет запись `func(db, ...)` писателю, если включен режим одного писателя.
+    Вызов ждет фиксации записи; после него сессия `db` видит записанное.
+    Фиксация записи отмечается для текущего обновления (`db.update_writes`).
+    """
+    @functools.wraps(func)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        if _in_writer.get():
+            return await func(db, *args, **kwargs)
+        if sqlite_writer is None:
+            result = await func(db, *args, **kwargs)
+            mark_committed_on_commit(db)
+            return result
+        result = await sqlite_writer.submit(func, *args, **kwargs)
+        mark_committed()
+        # Открытая транзакция чтения видит снимок БД до записи, завершаем ее
+        if db.in_transaction():
+            await db.commit()
+        return result
+    return wrapper
+
+
+def writer_stats() -> dict:
+    """Возвращает метрики писателя или признак того, что режим выключен."""
+    if sqlite_writer is None:
+        return {"enabled": False}
+    return sqlite_writer.stats()
@@ -0,0 +1,59 @@
+"""
+Модуль с отметкой о записанных при обработке обновления изменениях.
+
+Если обработчик упал после того, как его изменения зафиксированы (или приняты
+буфером `db.write_behind`), повторная доставка того же обновления применила бы
+их второй раз: например, отметка checkbox переключилась бы обратно. По отметке
+вебхук решает, можно ли принять повтор. Отметка передается через contextvars,
+поэтому функции записи получают ее без изменения сигнатур.
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+@dataclass(slots=True)
+class UpdateWrites:
+    """Записанные изменения при обработке одного обновления."""
+    committed: bool = False
+
+
+_update_writes: ContextVar[UpdateWrites | None] = ContextVar(
+    "db_update_writes", default=None
+)
+
+
+def track_update_writes() -> UpdateWrites:
+    """Начинает учет записей обновления, обрабатываемого в текущем контексте."""
+    writes = UpdateWrites()
+    _update_writes.set(writes)
+    return writes
+
+
+def mark_committed() -> None:
+    """Отмечает, что изменения текущего обновления уже записаны."""
+    writes = _update_writes.get()
+    if writes is not None:
+        writes.committed = True
+
+
+def mark_committed_on_commit(db: AsyncSession) -> None:
+    """Отметит изменения текущего обновления записанными после фиксации транзакции."""
+    writes = _update_writes.get()
+    if writes is not None:
+        db.info.setdefault("update_writes", []).append(writes)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_after_commit(session: Session) -> None:
+    for writes in session.info.pop("update_writes", ()):
+        writes.committed = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop("update_writes", None)
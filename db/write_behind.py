@@ -0,0 +1,227 @@
+"""
+Модуль с отложенной записью логов активностей (write-behind).
+
+При `WRITE_BEHIND_ENABLED` отметки checkbox-активностей и введенные вручную
+минуты не пишутся в БД сразу, а копятся в памяти по ключу (активность, дата):
+несколько нажатий подряд сливаются в одно изменение. Запуск и остановка
+таймеров идут сразу в БД. Фоновая задача записывает накопленное пачками в отдельных транзакциях
+каждые `WRITE_BEHIND_FLUSH_MS` миллисекунд или сразу при заполнении пачки,
+а при остановке дописывает все оставшееся. Экран активностей читает данные
+из БД с наложением еще не записанных изменений.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from core.config import settings
+from db import crud
+from db.cache import data_versions
+from db.database import async_session_factory
+from db.instrumentation import COUNT_BUCKETS, TIME_BUCKETS_MS, Histogram
+from db.read_models import ActivitiesPage, ActivityRow
+from db.update_writes import mark_committed
+
+logger = logging.getLogger(__name__)
+
+PendingKey = tuple[int, datetime.date]
+
+
+@dataclass(slots=True)
+class PendingLog:
+    """Незаписанные изменения лога одной активности за дату."""
+    user_id: int
+    toggles: int = 0
+    minutes_set: int | None = None
+
+    def merge(self, newer: "PendingLog") -> None:
+        """Добавляет более поздние изменения того же лога."""
+        self.toggles += newer.toggles
+        if newer.minutes_set is not None:
+            self.minutes_set = newer.minutes_set
+
+    def apply(self, row: ActivityRow) -> ActivityRow:
+        """Возвращает строку экрана с наложенными изменениями."""
+        value_bool = row.value_bool
+        if self.toggles % 2:
+            value_bool = not value_bool
+        value_minutes = row.value_minutes
+        if self.minutes_set is not None:
+            value_minutes = self.minutes_set
+        return dataclasses.replace(row, value_bool=value_bool, value_minutes=value_minutes)
+
+
+class WriteBehindBuffer:
+    """Буфер незаписанных изменений логов с фоновой записью пачками."""
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: dict[PendingKey, PendingLog] = {}
+        self._in_flight: dict[PendingKey, PendingLog] = {}
+        # Растет после каждой фиксации пачки, по нему чтение понимает, что надо повторить
+        self._generation = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.taps = 0
+        self.flushes = 0
+        self.flushed_logs = 0
+        self.failures = 0
+        self.batch_sizes = Histogram(COUNT_BUCKETS)
+        self.flush_time_ms = Histogram(TIME_BUCKETS_MS)
+
+    def toggle_checkbox(self, user_id: int, activity_id: int, log_date: datetime.date) -> None:
+        """Запоминает переключение отметки checkbox-активности."""
+        self._entry(user_id, activity_id, log_date).toggles += 1
+
+    def set_minutes(
+        self, user_id: int, activity_id: int, log_date: datetime.date, minutes: int
+    ) -> None:
+        """Запоминает перезапись минут в логе time-активности."""
+        self._entry(user_id, activity_id, log_date).minutes_set = minutes
+
+    def _entry(self, user_id: int, activity_id: int, log_date: datetime.date) -> PendingLog:
+        self.taps += 1
+        # Нажатие принято: повтор обновления не должен применить его еще раз
+        mark_committed()
+        # Кэш статистики не должен отдать ответ без этого нажатия
+        data_versions.bump(user_id)
+        key = (activity_id, log_date)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = PendingLog(user_id=user_id)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+        return entry
+
+    async def read_through(
+        self, load: Callable[[], Awaitable[ActivitiesPage]], log_date: datetime.date
+    ) -> ActivitiesPage:
+        """
+        Загружает страницу экрана и накладывает на ее строки незаписанные изменения.
+        Если во время загрузки зафиксировалась пачка, строки читаются заново:
+        иначе было бы неясно, видит ли загрузка эту пачку.
+        """
+        while True:
+            generation = self._generation
+            page = await load()
+            if generation == self._generation:
+                break
+        return dataclasses.replace(page, rows=[self._apply(row, log_date) for row in page.rows])
+
+    def _apply(self, row: ActivityRow, log_date: datetime.date) -> ActivityRow:
+        key = (row.id, log_date)
+        for pending in (self._in_flight, self._pending):
+            entry = pending.get(key)
+            if entry is not None:
+                row = entry.apply(row)
+        return row
+
+    async def start(self) -> None:
+        """Запускает фоновую запись."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись и дописывает все накопленное."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать отложенные изменения логов")
+
+    async def flush_log(self, activity_id: int, log_date: datetime.date) -> None:
+        """Дописывает буфер, если в нем есть изменения лога активности за дату."""
+        key = (activity_id, log_date)
+        if key in self._pending or key in self._in_flight:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает все накопленные изменения пачками по `batch_size`."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._in_flight, self._pending = self._pending, {}
+            items = list(self._in_flight.items())
+            for offset in range(0, len(items), self.batch_size):
+                batch = items[offset:offset + self.batch_size]
+                try:
+                    await self._write_batch(batch)
+                except Exception:
+                    self.failures += 1
+                    self._restore(items[offset:])
+                    raise
+                for key, _ in batch:
+                    del self._in_flight[key]
+                self._generation += 1
+
+    async def _write_batch(self, batch: list[tuple[PendingKey, PendingLog]]) -> None:
+        started = time.perf_counter()
+        changes = [
+            (
+                entry.user_id, activity_id, log_date,
+                entry.toggles % 2 == 1, entry.minutes_set,
+            )
+            for (activity_id, log_date), entry in batch
+        ]
+        async with async_session_factory() as db:
+            # Одним вызовом: пачка записывается или откатывается целиком,
+            # иначе после ошибки возвращенные в буфер изменения применились бы дважды
+            await crud.apply_log_changes(db, changes)
+            await db.commit()
+        self.flushes += 1
+        self.flushed_logs += len(batch)
+        self.batch_sizes.observe(len(batch))
+        self.flush_time_ms.observe((time.perf_counter() - started) * 1000)
+
+    def _restore(self, items: list[tuple[PendingKey, PendingLog]]) -> None:
+        """Возвращает незаписанные изменения в буфер перед более новыми."""
+        pending, self._pending = self._pending, {}
+        for key, entry in items:
+            self._pending[key] = entry
+            self._in_flight.pop(key, None)
+        for key, entry in pending.items():
+            if key in self._pending:
+                self._pending[key].merge(entry)
+            else:
+                self._pending[key] = entry
+
+    def stats(self) -> dict:
+        """Возвращает размер буфера, счетчики и гистограммы записи."""
+        return {
+            "enabled": settings.WRITE_BEHIND_ENABLED,
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "taps": self.taps,
+            "flushes": self.flushes,
+            "flushed_logs": self.flushed_logs,
+            "failures": self.failures,
+            "batch_size": self.batch_sizes.snapshot(),
+            "flush_time_ms": self.flush_time_ms.snapshot(),
+        }
+
+
+write_behind = WriteBehindBuffer(
+    flush_interval=settings.WRITE_BEHIND_FLUSH_MS / 1000,
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+)
@@ -3,14 +3,32 @@
 import asyncio
 import logging
 
-from aiogram import Bot, Dispatcher, types
-from aiogram.fsm.storage.memory import MemoryStorage
-from fastapi import FastAPI
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramRetryAfter
+from fastapi import FastAPI, Request, Response, status
 
 from bot.handlers import stats as stats_handlers, download as download_handlers, \
     track_activity as track_activity_handlers, common as common_handlers, \
-    add_activity as add_activity_handlers, help as help_handlers
+    add_activity as add_activity_handlers, help as help_handlers, jobs as jobs_handlers, \
+    import_data as import_data_handlers
+from bot.dedup import UpdateDeduplicator
+from bot.dispatch import callbacks
+from bot.ingestion import UpdateQueue
+from bot.jobs import job_queue
+from bot.keyboards.diff import markup_fingerprints
+from bot.keyboards.inline import calendar_cache_stats
+from bot.middlewares.db import DbSessionMiddleware
+from bot.middlewares.instrumentation import QueryCounterMiddleware
+from bot.storage.factory import create_storage
+from bot.throttling import outbound_throttler
+from bot.webhook import SECRET_HEADER, UpdateParser, is_valid_secret
 from core.config import settings
+from db.cache import activity_cache
+from db.database import async_engine, async_session_factory, pool_stats
+from db.instrumentation import query_stats
+from db.sqlite_writer import sqlite_writer, writer_stats
+from db.update_writes import track_update_writes
+from db.write_behind import write_behind
 
 
 # Настройка логирования
@@ -18,9 +36,39 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
-storage = MemoryStorage()
+storage = create_storage(settings)
 bot = Bot(token=settings.BOT_TOKEN)
+# Все исходящие запросы проходят через ограничение частоты
+bot.session.middleware(outbound_throttler)
+# Отпечатки клавиатур забываются при любом изменении сообщения
+bot.session.middleware(markup_fingerprints)
 dp = Dispatcher(storage=storage)
+# aiogram регистрирует закрытие FSM первым обработчиком остановки, а фоновые задачи
+# еще могут менять состояние при остановке: закрытие перенесено в конец (ниже)
+dp.shutdown.handlers = [
+    handler for handler in dp.shutdown.handlers if handler.callback != dp.fsm.close
+]
+# Фоновая очередь задач живет вместе с диспетчером
+dp.startup.register(job_queue.start)
+dp.shutdown.register(job_queue.stop)
+# Одна сессия БД на обновление, обработчики получают ее в аргументе db
+dp.update.outer_middleware(DbSessionMiddleware(async_session_factory))
+if settings.WRITE_BEHIND_ENABLED:
+    # Накопленные нажатия дописываются до закрытия движка
+    dp.startup.register(write_behind.start)
+    dp.shutdown.register(write_behind.stop)
+if sqlite_writer is not None:
+    # Писатель останавливается после буфера: тот дописывает изменения через него
+    dp.startup.register(sqlite_writer.start)
+    dp.shutdown.register(sqlite_writer.stop)
+# Дописываем отложенные изменения FSM при остановке (и в режиме опроса, и с вебхуком),
+# после фоновых задач: обработчики остановки выполняются в порядке регистрации
+dp.shutdown.register(dp.fsm.close)
+dp.shutdown.register(async_engine.dispose)
+if settings.DB_QUERY_STATS:
+    # Запросы к БД помечаются обработчиком, который их выполнил
+    dp.message.middleware(QueryCounterMiddleware())
+    dp.callback_query.middleware(QueryCounterMiddleware())
 
 # Регистрация роутеров
 dp.include_router(common_handlers.router)
@@ -29,6 +77,26 @@ dp.include_router(track_activity_handlers.router)
 dp.include_router(download_handlers.router)
 dp.include_router(stats_handlers.router)
 dp.include_router(help_handlers.router)
+dp.include_router(import_data_handlers.router)
+# Все колбэки обрабатываются таблицей: обработчики модулей выше и jobs_handlers
+# регистрируются в ней при импорте
+dp.include_router(callbacks.router)
+
+# Очередь обновлений вебхука (используется при WEBHOOK_MODE=queue)
+update_queue = UpdateQueue(
+    dispatcher=dp,
+    bot=bot,
+    workers=settings.WEBHOOK_WORKERS,
+    queue_size=settings.WEBHOOK_QUEUE_SIZE,
+)
+
+# Разбор тела вебхука в Update за один проход
+update_parser = UpdateParser(bot, backend=settings.WEBHOOK_JSON_BACKEND)
+
+# Отсечение повторных доставок одного и того же обновления
+deduplicator = UpdateDeduplicator(
+    size=settings.DEDUP_WINDOW, path=settings.DEDUP_STATE_PATH
+)
 
 # Создание экземпляра FastAPI
 app = FastAPI()
@@ -42,28 +110,126 @@ WEBHOOK_URL = settings.SERVER_URL + WEBHOOK_PATH
 async def on_startup():
     """Действия при старте приложения."""
     logger.info("Приложение запускается...")
+    deduplicator.load()
+    await dp.emit_startup(bot=bot)
+    if settings.WEBHOOK_MODE == "queue":
+        await update_queue.start()
     # Установка вебхука
     webhook_info = await bot.get_webhook_info()
-    if webhook_info.url != WEBHOOK_URL:
-        await bot.set_webhook(url=WEBHOOK_URL)
-        logger.info(f"Вебхук установлен на URL: {WEBHOOK_URL}")
+    # Секрет Telegram не возвращает, поэтому при его настройке вебхук ставится всегда
+    if webhook_info.url != WEBHOOK_URL or settings.WEBHOOK_SECRET:
+        try:
+            await bot.set_webhook(url=WEBHOOK_URL, secret_token=settings.WEBHOOK_SECRET)
+        except TelegramRetryAfter:
+            # Процессы uvicorn стартуют вместе и ставят один и тот же вебхук:
+            # лимит означает, что его только что поставил другой процесс
+            logger.info("Вебхук уже устанавливается другим процессом.")
+        else:
+            logger.info(f"Вебхук установлен на URL: {WEBHOOK_URL}")
     else:
         logger.info("Вебхук уже настроен.")
 
 
 @app.post(WEBHOOK_PATH)
-async def bot_webhook(update: dict):
+async def bot_webhook(request: Request):
     """
     Принимает обновления от Telegram и передает их в диспетчер.
+    В режиме очереди отвечает сразу, а обработка идет в воркерах.
+    Запросы без верного секрета отклоняются до чтения тела.
     """
-    telegram_update = types.Update(**update)
-    await dp.feed_update(bot=bot, update=telegram_update)
+    if not is_valid_secret(request.headers.get(SECRET_HEADER), settings.WEBHOOK_SECRET):
+        return Response(status_code=status.HTTP_403_FORBIDDEN)
+    try:
+        telegram_update = update_parser.parse(await request.body())
+    except ValueError:
+        logger.warning("Тело запроса вебхука не является обновлением Telegram")
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    if deduplicator.check_and_mark(telegram_update.update_id):
+        # Повторная доставка уже принятого обновления
+        return
+    if settings.WEBHOOK_MODE == "queue":
+        if not update_queue.put_nowait(telegram_update):
+            # Очередь переполнена - Telegram повторит доставку позже
+            deduplicator.forget(telegram_update.update_id)
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return
+    writes = track_update_writes()
+    try:
+        await dp.feed_update(bot=bot, update=telegram_update)
+    except Exception:
+        if writes.committed:
+            # Изменения уже записаны: повтор применил бы их второй раз, поэтому
+            # отвечаем 200 и оставляем обновление отмеченным
+            logger.exception(
+                "Ошибка после записи изменений обновления %s", telegram_update.update_id
+            )
+            return
+        # Telegram повторит доставку после ошибки - повтор не должен считаться дублем
+        deduplicator.forget(telegram_update.update_id)
+        raise
+
+
+@app.get("/metrics/updates")
+async def updates_metrics():
+    """Отдает метрики очереди входящих обновлений."""
+    return {**update_queue.stats(), "duplicates": deduplicator.duplicates}
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Отдает счетчики кэшей для подбора их размера."""
+    return {
+        "activities": activity_cache.stats(),
+        "rendered_stats": stats_handlers.rendered_stats_cache.stats(),
+        "calendar": calendar_cache_stats(),
+        "keyboard_fingerprints": markup_fingerprints.stats(),
+    }
+
+
+@app.get("/metrics/outbound")
+async def outbound_metrics():
+    """Отдает метрики ограничения исходящих запросов к Telegram."""
+    return outbound_throttler.stats()
+
+
+@app.get("/metrics/db-pool")
+async def db_pool_metrics():
+    """Отдает состояние пула соединений с БД и время ожидания соединений."""
+    return pool_stats()
+
+
+@app.get("/metrics/queries")
+async def queries_metrics():
+    """Отдает гистограммы времени запросов к БД и количества запросов на обновление."""
+    return query_stats.snapshot()
+
+
+@app.get("/metrics/write-behind")
+async def write_behind_metrics():
+    """Отдает размер буфера отложенной записи, размеры пачек и время записи."""
+    return write_behind.stats()
+
+
+@app.get("/metrics/sqlite-writer")
+async def sqlite_writer_metrics():
+    """Отдает очередь писателя SQLite, размеры транзакций и время их выполнения."""
+    return writer_stats()
+
+
+@app.get("/metrics/jobs")
+async def jobs_metrics():
+    """Отдает состояние фоновой очереди задач."""
+    return job_queue.stats()
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     """Действия при остановке приложения."""
     logger.info("Приложение останавливается...")
+    if settings.WEBHOOK_MODE == "queue":
+        await update_queue.stop(timeout=settings.WEBHOOK_DRAIN_TIMEOUT)
+    await dp.emit_shutdown(bot=bot)
+    deduplicator.save()
     # Корректное закрытие сессии бота
     await bot.session.close()
     logger.info("Сессия бота закрыта.")
@@ -0,0 +1,131 @@
+"""
+Тесты FSM-хранилища `BufferedStorage` поверх бэкенда Redis.
+
+Вместо сервера Redis используется fakeredis: несколько клиентов одного
+`FakeServer` ведут себя как процессы, подключенные к общему серверу.
+"""
+
+import asyncio
+import datetime
+
+import fakeredis
+import pytest
+
+from aiogram.fsm.storage.base import DefaultKeyBuilder, StorageKey
+
+from bot.storage.base import BufferedStorage
+from bot.storage.redis import RedisBackend
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+
+class CountingRedisBackend(RedisBackend):
+    """Бэкенд Redis на fakeredis, запоминающий записанные пакеты."""
+
+    def __init__(self, server: fakeredis.FakeServer):
+        super().__init__("redis://localhost")
+        self.redis = fakeredis.FakeAsyncRedis(server=server)
+        self.batches: list[set[str]] = []
+
+    async def write_many(self, records):
+        self.batches.append(set(records))
+        await super().write_many(records)
+
+
+def make_storage(server: fakeredis.FakeServer, **kwargs) -> BufferedStorage:
+    return BufferedStorage(CountingRedisBackend(server), **kwargs)
+
+
+async def stored_state(server: fakeredis.FakeServer, key: StorageKey) -> bytes | None:
+    """Читает состояние прямо из Redis, мимо горячего слоя."""
+    redis = fakeredis.FakeAsyncRedis(server=server)
+    try:
+        return await redis.hget(DefaultKeyBuilder().build(key), "state")
+    finally:
+        await redis.aclose()
+
+
+@pytest.fixture
+def server() -> fakeredis.FakeServer:
+    return fakeredis.FakeServer()
+
+
+def test_flush_loop_writes_changes_in_background(server):
+    async def scenario():
+        storage = make_storage(server, flush_interval=0.05)
+        await storage.set_state(KEY, "Form:name")
+        assert await stored_state(server, KEY) is None
+        await asyncio.sleep(0.2)
+        assert await stored_state(server, KEY) == b"Form:name"
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_repeated_changes_of_key_are_coalesced(server):
+    async def scenario():
+        storage = make_storage(server, flush_interval=60)
+        await storage.set_state(KEY, "Form:name")
+        await storage.set_data(KEY, {"day": datetime.date(2025, 3, 1)})
+        await storage.set_state(KEY, "Form:age")
+        await storage.set_state(OTHER_KEY, "Form:name")
+        await storage.flush()
+
+        assert len(storage.backend.batches) == 1
+        assert len(storage.backend.batches[0]) == 2
+
+        reader = make_storage(server, flush_interval=60)
+        assert await reader.get_state(KEY) == "Form:age"
+        assert await reader.get_data(KEY) == {"day": datetime.date(2025, 3, 1)}
+        await storage.close()
+        await reader.close()
+
+    asyncio.run(scenario())
+
+
+def test_full_batch_is_flushed_early(server):
+    async def scenario():
+        storage = make_storage(server, flush_interval=60, batch_size=2)
+        await storage.set_state(KEY, "Form:name")
+        await storage.set_state(OTHER_KEY, "Form:name")
+        await asyncio.sleep(0.05)
+        assert storage.backend.batches == [{
+            storage.key_builder.build(KEY), storage.key_builder.build(OTHER_KEY)
+        }]
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_cache_is_bypassed_without_buffering(server):
+    async def scenario():
+        first = make_storage(server, flush_interval=0, cache_ttl=60)
+        second = make_storage(server, flush_interval=0, cache_ttl=60)
+        assert await second.get_state(KEY) is None
+
+        await first.set_state(KEY, "Form:name")
+        assert await stored_state(server, KEY) == b"Form:name"
+        assert await second.get_state(KEY) == "Form:name"
+
+        await second.set_state(KEY, None)
+        assert await first.get_state(KEY) is None
+        await first.close()
+        await second.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_drains_pending_changes(server):
+    async def scenario():
+        storage = make_storage(server, flush_interval=60)
+        await storage.set_state(KEY, "Form:name")
+        await storage.set_data(KEY, {"name": "Бег"})
+        await storage.close()
+
+        assert await stored_state(server, KEY) == b"Form:name"
+        reader = make_storage(server)
+        assert await reader.get_data(KEY) == {"name": "Бег"}
+        await reader.close()
+
+    asyncio.run(scenario())